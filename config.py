@@ -21,5 +21,25 @@ class Config:
 
     OWNER: int = 196583204164075520
 
+    DB_CACHE_MAX_ROWS: t.Optional[int] = 50000  # Rows kept in memory per cached database table, None for no limit
+
+    DB_CACHE_TTL: t.Optional[float] = 3600  # Seconds until cached database rows are reloaded, None to never expire
+
+    DB_POOL_MIN_SIZE: int = 10  # Connections the database pool is initialized with and keeps open
+
+    DB_POOL_MAX_SIZE: int = 10  # Maximum connections of the database pool, commands wait for a free one above this
+
+    DB_POOL_MAX_IDLE: float = 300.0  # Seconds until an idle pooled connection above DB_POOL_MIN_SIZE is closed
+
+    DB_STATEMENT_CACHE_SIZE: int = 100  # Queries prepared and kept per pooled connection, 0 to disable
+
+    DB_COMMAND_TIMEOUT: t.Optional[float] = None  # Default timeout in seconds of every query, None for no timeout
+
+    DB_SLOW_QUERY_THRESHOLD: t.Optional[float] = 0.5  # Queries running longer than this in seconds are logged
+
+    MATCHMAKING_TIME_BUDGET: float = 0.2  # Seconds spent improving the balance of lobbies formed from a pool of players
+
+    MATCHMAKING_QUEUE_MAX_DIFF: t.Optional[int] = 50  # Largest team mmr difference of a popped lobby, None for any
+
 # by fenrir#5455
 
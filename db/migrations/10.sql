@@ -0,0 +1,24 @@
+-- Snapshots of the in-memory matchmaking queues, so that they survive a restart of the bot.
+-- The queues live in memory and are written here periodically and on shutdown.
+
+CREATE TABLE IF NOT EXISTS matchmaking_queues
+(
+    guild_id    bigint NOT NULL,
+    room_id     bigint NOT NULL,
+    win_points  int    NOT NULL,
+    lose_points int    NOT NULL,
+    delta_mmr   int    NOT NULL,
+    PRIMARY KEY (guild_id, room_id)
+);
+
+CREATE TABLE IF NOT EXISTS matchmaking_queue_players
+(
+    guild_id bigint NOT NULL,
+    room_id  bigint NOT NULL,
+    position int    NOT NULL,
+    id       bigint NOT NULL,
+    PRIMARY KEY (guild_id, room_id, position),
+    FOREIGN KEY (guild_id, room_id)
+        REFERENCES matchmaking_queues (guild_id, room_id)
+        ON DELETE CASCADE
+);
@@ -0,0 +1,41 @@
+-- Maintain player_rankings incrementally: only the rows of the players that changed are written.
+-- Ranks are computed in memory by the bot, so the rank columns are dropped instead of renumbering
+-- the whole season on every write.
+
+DROP FUNCTION IF EXISTS refresh_player_rankings(bigint, varchar);
+
+DROP INDEX IF EXISTS player_rankings_points_rank_idx;
+DROP INDEX IF EXISTS player_rankings_league_points_rank_idx;
+
+ALTER TABLE player_rankings
+    DROP COLUMN IF EXISTS points_rank,
+    DROP COLUMN IF EXISTS league_points_rank,
+    DROP COLUMN IF EXISTS league_mmr_rank;
+
+CREATE OR REPLACE FUNCTION refresh_player_rankings(_guild_id bigint, _season varchar, _ids bigint[])
+    RETURNS SETOF player_rankings AS
+$$
+BEGIN
+    DELETE FROM player_rankings AS r
+    WHERE r.guild_id = _guild_id AND r.season = _season AND r.id = ANY(_ids)
+      AND NOT EXISTS(SELECT 1 FROM players_stats AS ps
+                     WHERE ps.guild_id = r.guild_id AND ps.season = r.season AND ps.id = r.id);
+
+    INSERT INTO player_rankings AS r (guild_id, season, id, btag, league, mmr, points, win, lose)
+    SELECT ps.guild_id, ps.season, ps.id, p.btag, p.league, p.mmr, ps.points, ps.win, ps.lose
+    FROM players_stats AS ps
+    INNER JOIN players AS p ON p.id = ps.id
+    WHERE ps.guild_id = _guild_id AND ps.season = _season AND ps.id = ANY(_ids)
+    ON CONFLICT (guild_id, season, id) DO UPDATE
+    SET btag   = excluded.btag,
+        league = excluded.league,
+        mmr    = excluded.mmr,
+        points = excluded.points,
+        win    = excluded.win,
+        lose   = excluded.lose
+    WHERE (r.btag, r.league, r.mmr, r.points, r.win, r.lose)
+          IS DISTINCT FROM (excluded.btag, excluded.league, excluded.mmr, excluded.points, excluded.win, excluded.lose);
+
+    RETURN QUERY SELECT * FROM player_rankings WHERE guild_id = _guild_id AND season = _season AND id = ANY(_ids);
+END;
+$$ LANGUAGE plpgsql;
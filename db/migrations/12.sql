@@ -0,0 +1,4 @@
+-- The message with the join and leave buttons of each queue, so that the buttons
+-- keep working after a restart of the bot.
+
+ALTER TABLE matchmaking_queues ADD COLUMN IF NOT EXISTS message_id bigint;
@@ -0,0 +1,29 @@
+-- Notify every bot process connected to the database when the stats or the profile of a player change,
+-- so that the rankings they keep in memory can refresh the player, also after changes made directly in SQL.
+
+CREATE OR REPLACE FUNCTION notify_player_rankings() RETURNS trigger AS
+$$
+DECLARE _row jsonb;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        _row := to_jsonb(OLD);
+    ELSE
+        _row := to_jsonb(NEW);
+    END IF;
+
+    -- The season is null for players, whose mmr and league are part of every season
+    PERFORM pg_notify('player_rankings', json_build_object(
+        'guild_id', _row -> 'guild_id', 'season', _row -> 'season', 'id', _row -> 'id'
+    )::text);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS player_rankings ON players_stats;
+CREATE TRIGGER player_rankings AFTER INSERT OR UPDATE OR DELETE ON players_stats
+    FOR EACH ROW EXECUTE FUNCTION notify_player_rankings();
+
+DROP TRIGGER IF EXISTS player_rankings ON players;
+CREATE TRIGGER player_rankings AFTER INSERT OR UPDATE OR DELETE ON players
+    FOR EACH ROW EXECUTE FUNCTION notify_player_rankings();
@@ -0,0 +1,45 @@
+-- Notify every bot process connected to the database when a cached table changes,
+-- so that their DatabaseCache can drop the affected rows.
+
+CREATE OR REPLACE FUNCTION notify_cache_invalidation() RETURNS trigger AS
+$$
+DECLARE _old jsonb;
+DECLARE _new jsonb;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        _old := to_jsonb(OLD);
+        PERFORM pg_notify('cache_invalidation', json_build_object(
+            'table', TG_TABLE_NAME, 'guild_id', _old -> 'guild_id', 'user_id', _old -> 'user_id'
+        )::text);
+    END IF;
+
+    IF TG_OP <> 'DELETE' THEN
+        _new := to_jsonb(NEW);
+        -- Updates only need a second notification if they moved the row to another key
+        IF _old IS NULL
+            OR _old -> 'guild_id' IS DISTINCT FROM _new -> 'guild_id'
+            OR _old -> 'user_id' IS DISTINCT FROM _new -> 'user_id' THEN
+            PERFORM pg_notify('cache_invalidation', json_build_object(
+                'table', TG_TABLE_NAME, 'guild_id', _new -> 'guild_id', 'user_id', _new -> 'user_id'
+            )::text);
+        END IF;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO
+$do$
+DECLARE _table text;
+BEGIN
+    FOREACH _table IN ARRAY ARRAY['global_config', 'users', 'preferences', 'blacklist', 'mod_config'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS cache_invalidation ON %I', _table);
+        EXECUTE format(
+            'CREATE TRIGGER cache_invalidation AFTER INSERT OR UPDATE OR DELETE ON %I
+            FOR EACH ROW EXECUTE FUNCTION notify_cache_invalidation()',
+            _table
+        );
+    END LOOP;
+END
+$do$;
@@ -0,0 +1,46 @@
+-- Ranking of the players of each guild and season, so that leaderboards and league positions
+-- are index lookups instead of sorting the whole season on every call.
+
+CREATE TABLE IF NOT EXISTS player_rankings
+(
+    guild_id           bigint  NOT NULL,
+    season             varchar NOT NULL,
+    id                 bigint  NOT NULL,
+    btag               varchar,
+    league             league_type,
+    mmr                int,
+    points             int,
+    win                int,
+    lose               int,
+    points_rank        int     NOT NULL,
+    league_points_rank int     NOT NULL,
+    league_mmr_rank    int     NOT NULL,
+    PRIMARY KEY (guild_id, season, id)
+);
+
+CREATE INDEX IF NOT EXISTS player_rankings_points_rank_idx
+    ON player_rankings (guild_id, season, points_rank);
+
+CREATE INDEX IF NOT EXISTS player_rankings_league_points_rank_idx
+    ON player_rankings (guild_id, season, league, league_points_rank);
+
+-- Rebuild the ranking of one guild and season, called when a match of it ends
+CREATE OR REPLACE FUNCTION refresh_player_rankings(_guild_id bigint, _season varchar) RETURNS void AS
+$$
+BEGIN
+    DELETE FROM player_rankings WHERE guild_id = _guild_id AND season = _season;
+
+    INSERT INTO player_rankings (guild_id, season, id, btag, league, mmr, points, win, lose,
+                                 points_rank, league_points_rank, league_mmr_rank)
+    SELECT ps.guild_id, ps.season, ps.id, p.btag, p.league, p.mmr, ps.points, ps.win, ps.lose,
+           row_number() OVER (ORDER BY ps.points DESC, ps.id),
+           row_number() OVER (PARTITION BY p.league ORDER BY ps.points DESC, ps.id),
+           row_number() OVER (PARTITION BY p.league ORDER BY p.mmr DESC, ps.id)
+    FROM players_stats AS ps
+    INNER JOIN players AS p ON p.id = ps.id
+    WHERE ps.guild_id = _guild_id AND ps.season = _season;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT refresh_player_rankings(guild_id, season)
+FROM (SELECT DISTINCT guild_id, season FROM players_stats) AS seasons;
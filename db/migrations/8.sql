@@ -0,0 +1,74 @@
+-- Head-to-head results of every pair of players that played in the same matches,
+-- so that comparing two players does not scan both of their match histories.
+-- Each pair is stored once, with player_a < player_b.
+
+CREATE TABLE IF NOT EXISTS head_to_head
+(
+    guild_id        bigint NOT NULL,
+    player_a        bigint NOT NULL,
+    player_b        bigint NOT NULL,
+    together_wins   int    NOT NULL DEFAULT 0,
+    together_losses int    NOT NULL DEFAULT 0,
+    a_versus_wins   int    NOT NULL DEFAULT 0,
+    b_versus_wins   int    NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, player_a, player_b)
+);
+
+-- The trigger reads the other players of a match on every change to event_log
+CREATE INDEX IF NOT EXISTS event_log_guild_id_event_id_idx
+    ON event_log (guild_id, event_id);
+
+-- A missing winner counts as a loss, the same as in head_to_head_add, so that the trigger
+-- removes exactly what was added here when an old match is deleted or logged again
+INSERT INTO head_to_head (guild_id, player_a, player_b, together_wins, together_losses, a_versus_wins, b_versus_wins)
+SELECT a.guild_id, a.id, b.id,
+       count(*) FILTER (WHERE coalesce(a.winner, false) AND coalesce(b.winner, false)),
+       count(*) FILTER (WHERE NOT coalesce(a.winner, false) AND NOT coalesce(b.winner, false)),
+       count(*) FILTER (WHERE coalesce(a.winner, false) AND NOT coalesce(b.winner, false)),
+       count(*) FILTER (WHERE NOT coalesce(a.winner, false) AND coalesce(b.winner, false))
+FROM event_log AS a
+INNER JOIN event_log AS b ON b.event_id = a.event_id AND b.guild_id = a.guild_id AND b.id > a.id
+GROUP BY a.guild_id, a.id, b.id
+ON CONFLICT DO NOTHING;
+
+-- Add (or with _sign = -1 remove) the pairs a player's match log forms with the other players of the match
+CREATE OR REPLACE FUNCTION head_to_head_add(_guild_id bigint, _event_id int, _id bigint, _winner boolean, _sign int)
+    RETURNS void AS
+$$
+BEGIN
+    INSERT INTO head_to_head AS h (guild_id, player_a, player_b,
+                                   together_wins, together_losses, a_versus_wins, b_versus_wins)
+    SELECT _guild_id, least(_id, e.id), greatest(_id, e.id),
+           CASE WHEN _winner AND e.winner THEN _sign ELSE 0 END,
+           CASE WHEN NOT _winner AND NOT e.winner THEN _sign ELSE 0 END,
+           CASE WHEN _winner <> e.winner AND (_id < e.id) = _winner THEN _sign ELSE 0 END,
+           CASE WHEN _winner <> e.winner AND (_id < e.id) = e.winner THEN _sign ELSE 0 END
+    FROM (SELECT id, coalesce(winner, false) AS winner FROM event_log
+          WHERE event_id = _event_id AND guild_id = _guild_id AND id <> _id) AS e
+    ON CONFLICT (guild_id, player_a, player_b) DO UPDATE
+    SET together_wins   = h.together_wins + excluded.together_wins,
+        together_losses = h.together_losses + excluded.together_losses,
+        a_versus_wins   = h.a_versus_wins + excluded.a_versus_wins,
+        b_versus_wins   = h.b_versus_wins + excluded.b_versus_wins;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Keep head_to_head in sync with every change to event_log, in the transaction that made it
+CREATE OR REPLACE FUNCTION update_head_to_head() RETURNS trigger AS
+$$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM head_to_head_add(OLD.guild_id, OLD.event_id, OLD.id, coalesce(OLD.winner, false), -1);
+    END IF;
+
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM head_to_head_add(NEW.guild_id, NEW.event_id, NEW.id, coalesce(NEW.winner, false), 1);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS head_to_head ON event_log;
+CREATE TRIGGER head_to_head AFTER INSERT OR UPDATE OR DELETE ON event_log
+    FOR EACH ROW EXECUTE FUNCTION update_head_to_head();
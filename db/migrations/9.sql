@@ -0,0 +1,8 @@
+-- Match histories are read one page at a time, ordered by event_id,
+-- so each page is an index range scan instead of sorting the whole history.
+
+CREATE INDEX IF NOT EXISTS event_log_id_event_id_idx
+    ON event_log (id, event_id);
+
+CREATE INDEX IF NOT EXISTS event_history_guild_id_event_id_idx
+    ON event_history (guild_id, event_id);
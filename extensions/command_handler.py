@@ -274,6 +274,17 @@ async def application_error_handler(ctx: SamuroContext, error: BaseException) ->
             )
             return
 
+        if isinstance(error.original, errors.DuplicateRooms):
+            await ctx.respond(
+                embed=hikari.Embed(
+                    title="❌ Повторяющиеся комнаты",
+                    description="Каждая комната может быть указана только один раз",
+                    color=const.ERROR_COLOR,
+                ),
+                flags=hikari.MessageFlag.EPHEMERAL,
+            )
+            return
+
         if isinstance(error.original, errors.NoActiveEvent):
             await ctx.respond(
                 embed=hikari.Embed(
@@ -374,6 +374,60 @@ async def restore_db(ctx: SamuroPrefixContext) -> None:
     ctx.app.scheduler.restart()
 
 
+@dev.command
+@lightbulb.command("cachestats", "Show database cache usage per table.", aliases=["cstats"])
+@lightbulb.implements(lightbulb.PrefixCommand)
+async def cache_stats_cmd(ctx: SamuroPrefixContext) -> None:
+    stats = ctx.app.db_cache.stats()
+    lines = [f"{'table':<20} {'rows':>7} {'KiB':>8} {'hit %':>6} {'evicted':>8}"]
+    for s in stats:
+        name = f"{s.table}*" if s.pinned else s.table
+        lines.append(f"{name:<20} {s.entries:>7} {s.bytes / 1024:>8.1f} {s.hit_rate * 100:>6.1f} {s.evictions:>8}")
+    lines.append(
+        f"\nTotal: {sum(s.entries for s in stats)} rows, {sum(s.bytes for s in stats) / 1024:.1f} KiB (* pinned)"
+    )
+    await send_paginated(ctx, ctx.channel_id, "\n".join(lines), prefix="```\n", suffix="```")
+
+
+@dev.command
+@lightbulb.command("poolstats", "Show database connection pool usage and acquire wait times.", aliases=["pstats"])
+@lightbulb.implements(lightbulb.PrefixCommand)
+async def pool_stats_cmd(ctx: SamuroPrefixContext) -> None:
+    s = ctx.app.db.pool_stats()
+    lines = [
+        f"Connections: {s.size}/{s.max_size} open, {s.in_use} in use, {s.idle} idle",
+        f"Waiting:     {s.waiting}",
+        f"Acquires:    {s.acquires}, {s.wait_total:.3f}s spent waiting",
+        f"Wait (ms):   p50 {s.wait_p50 * 1000:.2f}, p95 {s.wait_p95 * 1000:.2f}, "
+        f"p99 {s.wait_p99 * 1000:.2f}, max {s.wait_max * 1000:.2f}",
+    ]
+    await ctx.respond("```\n" + "\n".join(lines) + "```")
+
+
+@dev.command
+@lightbulb.option("reset", "Reset the timings after showing them.", type=bool, default=False)
+@lightbulb.command(
+    "querystats", "Show database query timings by query, then optionally reset them.", aliases=["qstats"]
+)
+@lightbulb.implements(lightbulb.PrefixCommand)
+async def query_stats_cmd(ctx: SamuroPrefixContext) -> None:
+    stats = ctx.app.db.query_stats()
+    if ctx.options.reset:
+        ctx.app.db.reset_query_stats()
+
+    if not stats:
+        await ctx.respond("No queries recorded.")
+        return
+
+    lines = [f"{'count':>7} {'total s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}  query"]
+    for s in stats:
+        lines.append(
+            f"{s.count:>7} {s.total:>9.2f} {s.p50 * 1000:>8.2f} {s.p95 * 1000:>8.2f} "
+            f"{s.p99 * 1000:>8.2f} {s.max * 1000:>8.2f}  {textwrap.shorten(s.query, 120)}"
+        )
+    await send_paginated(ctx, ctx.channel_id, "\n".join(lines), prefix="```\n", suffix="```")
+
+
 @dev.command
 @lightbulb.option("user", "The user to manage.", type=hikari.User)
 @lightbulb.option("mode", "The mode of operation.", type=str)
@@ -14,18 +14,25 @@ import models
 import utils.helpers
 from etc import constants as const
 from models import SamuroBot
+from models import errors
 from models.checks import is_lead
 from models.components import *
 from models.context import SamuroSlashContext
 from models.context import SamuroUserContext
+from models.heroes import EventTypes
 from models.heroes import HotsEvent
 from models.heroes import HotsHero
 from models.heroes import HotsPlayer
 from models.heroes import fix_league_by_mmr
+from models.heroes import get_season
+from models.heroes import leagues
+from models.heroes import lobby_splits
 from models.plugin import SamuroPlugin
 from models.views import AuthorOnlyView
 from utils import hots as util
 from utils.hots import EventWinner
+from utils.matchqueue import LOBBY_SIZE
+from utils.matchqueue import MatchQueue
 from utils.nexuscompendium import weekly_rotation
 
 logger = logging.getLogger(__name__)
@@ -119,6 +126,71 @@ class EventView(miru.View):
             pass
 
 
+def queue_embed(queue: MatchQueue) -> hikari.Embed:
+    players = "\n".join(f"{number}. {player.mention} ({player.mmr})" for number, player in enumerate(queue, start=1))
+    return hikari.Embed(
+        title=f"Очередь на матч 5x5 ({len(queue)}/{LOBBY_SIZE})",
+        description=players or "Очередь пуста",
+        color=const.EMBED_BLUE,
+    )
+
+
+class QueueView(miru.View):
+    def __init__(self, *, room_id: int) -> None:
+        super(QueueView, self).__init__(timeout=None)
+        self.room_id = room_id
+
+    async def get_queue(self, ctx: miru.ViewContext) -> t.Optional[MatchQueue]:
+        queue = ctx.app.queues.get(ctx.guild_id, self.room_id)
+        if queue is None:
+            self.stop()
+            await ctx.edit_response(components=[])
+            await ctx.respond("Очередь закрыта", flags=hikari.MessageFlag.EPHEMERAL)
+        return queue
+
+    @miru.button(label="Войти", style=hikari.ButtonStyle.SUCCESS, custom_id="queue_join")
+    async def join_button(self, button: miru.Button, ctx: miru.ViewContext) -> None:
+        queue = await self.get_queue(ctx)
+        if queue is None:
+            return
+
+        try:
+            player = await HotsPlayer.fetch(ctx.member, ctx.guild_id)
+            ctx.app.queues.join(queue, player)
+        except errors.ProfileNotFound:
+            await ctx.respond(
+                "Профиль не найден, используйте команду `/profile add`", flags=hikari.MessageFlag.EPHEMERAL
+            )
+            return
+        except errors.UserBlacklistedError:
+            await ctx.respond("Вы заблокированы и не можете принимать участие", flags=hikari.MessageFlag.EPHEMERAL)
+            return
+        except errors.AlreadyQueued:
+            await ctx.respond("Вы уже в очереди", flags=hikari.MessageFlag.EPHEMERAL)
+            return
+
+        event = await ctx.app.queues.pop(queue, ctx.app.get_me(), max_diff=ctx.app.config.MATCHMAKING_QUEUE_MAX_DIFF)
+        await ctx.edit_response(embed=queue_embed(queue))
+        if event is not None:
+            await ctx.app.rest.create_message(
+                event.room_id,
+                content=" ".join(player.mention for player in event.blue + event.red),
+                embed=event.description(),
+                user_mentions=True,
+            )
+
+    @miru.button(label="Выйти", style=hikari.ButtonStyle.DANGER, custom_id="queue_leave")
+    async def leave_button(self, button: miru.Button, ctx: miru.ViewContext) -> None:
+        queue = await self.get_queue(ctx)
+        if queue is None:
+            return
+
+        if ctx.app.queues.leave(queue, ctx.user.id) is None:
+            await ctx.respond("Вас нет в очереди", flags=hikari.MessageFlag.EPHEMERAL)
+            return
+        await ctx.edit_response(embed=queue_embed(queue))
+
+
 class SkillSelect(miru.Select):
     def __init__(self, *, hero: HotsHero) -> None:
         super(SkillSelect, self).__init__(
@@ -286,6 +358,7 @@ async def set_season(ctx: SamuroSlashContext, name: str) -> None:
         None,
         name,
     )
+    await ctx.app.db_cache.refresh(table="global_config", guild_id=ctx.guild_id)
     await ctx.respond(
         embed=hikari.Embed(
             title="✅ Сезон обновлен",
@@ -306,34 +379,16 @@ async def set_season(ctx: SamuroSlashContext, name: str) -> None:
 @lightbulb.implements(lightbulb.SlashCommand)
 async def leaderboard(ctx: SamuroSlashContext) -> None:
     # Получаем текущий сезон
-    season = await ctx.app.db.fetchval(
-        """
-        SELECT season FROM global_config where guild_id = $1
-        """,
-        ctx.guild_id
-    )
-    
-    # Формируем базовый SQL запрос
-    sql = """
-        SELECT ps.*, p.btag, p.mmr, p.league
-        FROM players_stats ps
-        INNER JOIN players p ON ps.id = p.id
-        WHERE ps.guild_id = $1 AND ps.season = $2
-    """
-    
-    # Добавляем фильтр по лиге если она указана
-    params = [ctx.guild_id, season]
+    season = await get_season(ctx.guild_id)
+
+    # Лидеры берутся из рейтинга в памяти, который обновляется по завершению матчей
+    ranking = await ctx.app.rankings.get(ctx.guild_id, season)
     if ctx.options.league:
-        sql += " AND p.league = $3"
         # Конвертируем русское название лиги в английское
         eng_league = next(k for k, v in leagues.items() if v == ctx.options.league)
-        params.append(eng_league)
-
-    # Добавляем сортировку и лимит
-    sql += " ORDER BY ps.points DESC LIMIT 15"
-
-    # Получаем данные
-    records = await ctx.app.db.fetch(sql, *params)
+        records = ranking.leaderboard(15, league=eng_league)
+    else:
+        records = ranking.leaderboard(15)
 
     if not records:
         await ctx.respond("Нет данных для отображения")
@@ -350,12 +405,12 @@ async def leaderboard(ctx: SamuroSlashContext) -> None:
     )
 
     description = []
-    for i, record in enumerate(records, 1):
+    for i, player in enumerate(records, 1):
         medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}. "
-        winrate = round((record["win"] / (record["win"] + record["lose"])) * 100 if record["win"] + record["lose"] > 0 else 0)
+        winrate = round((player.win / (player.win + player.lose)) * 100 if player.win + player.lose > 0 else 0)
         description.append(
-            f"{medal} **{record['btag']}** ({record['league']})\n"
-            f"⭐ Очки: {record['points']} | 📊 {record['win']}Win/{record['lose']}Lose ({winrate}%)"
+            f"{medal} **{player.btag}** ({player.league})\n"
+            f"⭐ Очки: {player.points} | 📊 {player.win}Win/{player.lose}Lose ({winrate}%)"
         )
 
     embed.description = "\n\n".join(description)
@@ -485,9 +540,9 @@ async def get_profile(ctx: SamuroSlashContext, member: hikari.Member, battletag:
 async def get_history(ctx: SamuroSlashContext, member: hikari.Member) -> None:
     user = await HotsPlayer.fetch(member, guild_id=ctx.guild_id)
 
-    embeds = await user.log_page()
+    source = await user.log_source()
 
-    navigator = models.AuthorOnlyNavigator(ctx, pages=embeds)
+    navigator = models.AuthorOnlyNavigator(ctx, source=source)
 
     await navigator.send(ctx.interaction)
 
@@ -498,9 +553,9 @@ async def get_history(ctx: SamuroSlashContext, member: hikari.Member) -> None:
 async def get_history_user_command(ctx: SamuroUserContext, target: hikari.Member) -> None:
     user = await HotsPlayer.fetch(target, guild_id=ctx.guild_id)
 
-    embeds = await user.log_page()
+    source = await user.log_source()
 
-    navigator = models.AuthorOnlyNavigator(ctx, pages=embeds)
+    navigator = models.AuthorOnlyNavigator(ctx, source=source)
     await navigator.send(ctx.interaction)
 
 
@@ -517,8 +572,8 @@ async def hots_fix(ctx: SamuroSlashContext) -> None:
 @lightbulb.command("leagues", "Исправить лиги по ммр")
 @lightbulb.implements(lightbulb.SlashSubCommand)
 async def fix_leagues(ctx: SamuroSlashContext) -> None:
-    await fix_league_by_mmr(ctx)
-    await ctx.respond("Лиги игроков исправлены", flags=hikari.MessageFlag.EPHEMERAL)
+    changed = await fix_league_by_mmr(ctx)
+    await ctx.respond(f"Лиги игроков исправлены: {changed}", flags=hikari.MessageFlag.EPHEMERAL)
 
 
 @hots.command
@@ -591,25 +646,13 @@ async def event_capitans(ctx: SamuroSlashContext, players: t.List[hikari.Member]
 @lightbulb.command(name="list", description="Список всех ивентов")
 @lightbulb.implements(lightbulb.SlashSubCommand)
 async def event_list(ctx: SamuroSlashContext) -> None:
-    events = await HotsEvent.fetch_all(guild_id=ctx.guild_id)
+    source = await HotsEvent.list_source(ctx.guild_id)
 
-    if not events:
+    if not source:
         await ctx.respond("Нет событий на сервере")
+        return
 
-    paginator = lightbulb.utils.StringPaginator(max_chars=300)
-    for event in events:
-        emoji = util.get_emoji_winner(event.winner)
-        paginator.add_line(f"{emoji} ID: {event.id} - {event.ftime} - {event.map}")
-
-    embeds = [
-        hikari.Embed(
-            title="Список всех матчей сервера\nПобедитель, ID, Время, Карта",
-            description=page,
-            color=const.EMBED_BLUE,
-        )
-        for page in paginator.build_pages()
-    ]
-    navigator = models.AuthorOnlyNavigator(ctx, pages=embeds)
+    navigator = models.AuthorOnlyNavigator(ctx, source=source)
     await navigator.send(ctx.interaction)
 
 
@@ -759,6 +802,108 @@ async def event_create(
     await view.start(await resp.message())
 
 
+@hots_events.child
+@lightbulb.add_checks(is_lead)
+@lightbulb.option(
+    name="lose_p",
+    description="Баллы за поражение",
+    type=int,
+    min_value=1,
+    max_value=4,
+    default=1,
+)
+@lightbulb.option(
+    name="win_p",
+    description="Баллы за победу",
+    type=int,
+    min_value=4,
+    max_value=8,
+    default=4,
+)
+@lightbulb.option(
+    name="mmr",
+    description="Изменение ммр за матч",
+    type=int,
+    default=4,
+    min_value=0,
+    max_value=8,
+)
+@lightbulb.option(
+    name="rooms",
+    description="Комнаты для лобби",
+    type=str,
+    required=True,
+)
+@lightbulb.option(
+    name="players",
+    description="Игроки",
+    type=t.List[hikari.Member],
+    required=True,
+)
+@lightbulb.option(name="map", description="Карта", choices=util.maps, required=True)
+@lightbulb.command(name="lobbies", description="Создать ивенты во всех комнатах из пула игроков", pass_options=True)
+@lightbulb.implements(lightbulb.SlashSubCommand)
+async def event_create_lobbies(
+    ctx: SamuroSlashContext,
+    map: str,
+    players: str,
+    rooms: str,
+    mmr: int,
+    win_p: int,
+    lose_p: int,
+) -> None:
+    await ctx.respond(hikari.ResponseType.DEFERRED_MESSAGE_CREATE)
+
+    events = await HotsEvent.init_lobbies(
+        datetime.now(),
+        ctx,
+        rooms=util.players_parse(rooms),
+        win_p=win_p,
+        lose_p=lose_p,
+        delta_mmr=mmr,
+        map=map,
+        players=players,
+    )
+    for event in events:
+        await ctx.app.rest.create_message(event.room_id, embed=event.description())
+
+    await ctx.respond(
+        embed=hikari.Embed(
+            title="✅ Ивенты созданы!",
+            description="\n".join(f"<#{event.room_id}> - матч #{event.id}" for event in events),
+            color=const.EMBED_GREEN,
+        )
+    )
+
+
+@hots_events.child
+@lightbulb.add_checks(is_lead)
+@lightbulb.option(
+    name="players",
+    description="Игроки",
+    type=t.List[hikari.Member],
+    required=True,
+)
+@lightbulb.command(name="splits", description="Лучшие варианты составов команд", pass_options=True)
+@lightbulb.implements(lightbulb.SlashSubCommand)
+async def event_splits(ctx: SamuroSlashContext, players: str) -> None:
+    players, splits = await lobby_splits(ctx, players_str=players)
+
+    embed = hikari.Embed(
+        title="Лучшие варианты составов",
+        description=f"Для создания ивента используйте режим `{EventTypes.manual5x5.value}` с игроками варианта",
+        color=const.EMBED_BLUE,
+    )
+    for number, split in enumerate(splits, start=1):
+        blue = " ".join(players[index].mention for index in split.team_one)
+        red = " ".join(players[index].mention for index in split.team_two)
+        embed.add_field(
+            name=f"Вариант {number} (оценка {split.cost:.0f})",
+            value=f"{const.EMOJI_BLUE} {blue}\n{const.EMOJI_RED} {red}",
+        )
+    await ctx.respond(embed=embed)
+
+
 @hots_events.child
 @lightbulb.add_checks(is_lead)
 @lightbulb.command(name="remove", description="Удалить ивент")
@@ -825,6 +970,73 @@ async def inter_event(event: hikari.InteractionCreateEvent):
         return"""
 
 
+@hots.listener(hikari.StartedEvent)
+async def start_queue_views(event: hikari.StartedEvent) -> None:
+    """Перезапуск кнопок открытых очередей после перезапуска бота"""
+    # Пока очереди не восстановлены, кнопки закрыли бы их как несуществующие
+    await event.app.queues.wait_until_loaded()
+    for room_id, message_id in event.app.queues.messages():
+        QueueView(room_id=room_id).start_listener(message_id)
+
+
+@hots.command
+@lightbulb.command("queue", "Очередь на матчи")
+@lightbulb.implements(lightbulb.SlashCommandGroup)
+async def hots_queue(ctx: SamuroSlashContext) -> None:
+    pass
+
+
+@hots_queue.child
+@lightbulb.add_checks(is_lead)
+@lightbulb.option(
+    name="lose_p",
+    description="Баллы за поражение",
+    type=int,
+    min_value=1,
+    max_value=4,
+    default=1,
+)
+@lightbulb.option(
+    name="win_p",
+    description="Баллы за победу",
+    type=int,
+    min_value=4,
+    max_value=8,
+    default=4,
+)
+@lightbulb.option(
+    name="mmr",
+    description="Изменение ммр за матч",
+    type=int,
+    default=4,
+    min_value=0,
+    max_value=8,
+)
+@lightbulb.command(name="open", description="Открыть очередь на матчи в этой комнате", pass_options=True)
+@lightbulb.implements(lightbulb.SlashSubCommand)
+async def queue_open(ctx: SamuroSlashContext, mmr: int, win_p: int, lose_p: int) -> None:
+    queue = await ctx.app.queues.open(ctx.guild_id, ctx.channel_id, win_points=win_p, lose_points=lose_p, delta_mmr=mmr)
+    view = QueueView(room_id=ctx.channel_id)
+
+    resp = await ctx.respond(embed=queue_embed(queue), components=view.build())
+    message = await resp.message()
+    await view.start(message)
+    await ctx.app.queues.set_message(queue, message)
+
+
+@hots_queue.child
+@lightbulb.add_checks(is_lead)
+@lightbulb.command(name="close", description="Закрыть очередь на матчи в этой комнате")
+@lightbulb.implements(lightbulb.SlashSubCommand)
+async def queue_close(ctx: SamuroSlashContext) -> None:
+    queue = await ctx.app.queues.close(ctx.guild_id, ctx.channel_id)
+    if queue is None:
+        await ctx.respond("В этой комнате нет очереди", flags=hikari.MessageFlag.EPHEMERAL)
+        return
+
+    await ctx.respond(f"Очередь закрыта, игроков в ней было: {len(queue)}")
+
+
 @hots.command
 @lightbulb.command(
     name="weekly",
@@ -486,7 +486,7 @@ async def set_timezone(ctx: SamuroSlashContext, timezone: str) -> None:
         ctx.user.id,
         timezone.title(),
     )
-    await ctx.app.db_cache.refresh(table="preferences", user_id=ctx.user.id, timezone=timezone.title())
+    await ctx.app.db_cache.refresh(table="preferences", user_id=ctx.user.id)
 
     await ctx.respond(
         embed=hikari.Embed(
@@ -17,7 +17,7 @@ from etc import constants as const
 from models.db import Database
 from models.errors import UserBlacklistedError
 from models.mod_actions import ModActions
-from utils import cache, helpers, scheduler
+from utils import cache, helpers, matchqueue, ranking, scheduler
 from utils.tasks import IntervalLoop
 
 from .context import *
@@ -115,7 +115,9 @@ class SamuroBot(lightbulb.BotApp):
         self._config = config
         self._db = Database(self)
         self._session: t.Optional[aiohttp.ClientSession] = None
-        self._db_cache = cache.DatabaseCache(self)
+        self._db_cache = cache.DatabaseCache(self, max_rows=config.DB_CACHE_MAX_ROWS, ttl=config.DB_CACHE_TTL)
+        self._rankings = ranking.RankingIndex(self)
+        self._queues = matchqueue.QueueManager(self)
         self._mod = ModActions(self)
         miru.load(self)
 
@@ -168,6 +170,16 @@ class SamuroBot(lightbulb.BotApp):
         """The database cache instance of the bot."""
         return self._db_cache
 
+    @property
+    def rankings(self) -> ranking.RankingIndex:
+        """The in-memory player rankings of the bot."""
+        return self._rankings
+
+    @property
+    def queues(self) -> matchqueue.QueueManager:
+        """The matchmaking queues of the bot."""
+        return self._queues
+
     @property
     def scheduler(self) -> scheduler.Scheduler:
         """The scheduler instance of the bot."""
@@ -255,8 +267,9 @@ class SamuroBot(lightbulb.BotApp):
         # Connect to the database, update schema, apply pending migrations
         await self.db.connect()
         await self.db.update_schema()
-        # Start scheduler, DB cache
+        # Start scheduler, DB cache, rankings
         await self.db_cache.start()
+        await self.rankings.start()
         self.scheduler.start()
 
         if perspective_api_key := os.getenv("PERSPECTIVE_API_KEY"):
@@ -271,6 +284,8 @@ class SamuroBot(lightbulb.BotApp):
 
     async def on_started(self, event: hikari.StartedEvent) -> None:
         self._db_backup_loop.start()
+        await self.queues.load()
+        self.queues.start()
 
         user = self.get_me()
         self._user_id = user.id if user else None
@@ -303,6 +318,7 @@ class SamuroBot(lightbulb.BotApp):
     async def on_stopping(self, event: hikari.StoppingEvent) -> None:
         logging.info("Bot is shutting down...")
         self.scheduler.stop()
+        await self.queues.stop()
 
     async def on_stop(self, event: hikari.StoppedEvent) -> None:
         await self.db.close()
@@ -6,6 +6,7 @@ import hikari
 import lightbulb
 import miru
 
+from models.db import current_command
 from models.mod_actions import ModerationFlags
 
 from .views import AuthorOnlyView
@@ -49,6 +50,13 @@ class ConfirmView(AuthorOnlyView):
 class SamuroContext(lightbulb.Context):
     """Custom context for use across the bot."""
 
+    async def invoke(self) -> None:
+        token = current_command.set(self.command.qualname if self.command else None)
+        try:
+            await super().invoke()
+        finally:
+            current_command.reset(token)
+
     async def confirm(
         self,
         *args,
@@ -1,22 +1,143 @@
 from __future__ import annotations
 
 import abc
+import asyncio
 import logging
+import math
 import os
+import time
 import typing as t
+from collections import deque
 from contextlib import asynccontextmanager
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
 
 import asyncpg
+import attr
 import hikari
 
 from models.errors import DatabaseStateConflictError
+from models.statements import STATEMENTS
+from models.statements import Statement
 
 if t.TYPE_CHECKING:
     from models.bot import SamuroBot
     from utils.cache import DatabaseCache
+    from utils.ranking import RankingIndex
 
 logger = logging.getLogger(__name__)
 
+ACQUIRE_SAMPLES = 1000
+"""How many of the latest pool acquire wait times are kept to compute percentiles from."""
+
+QUERY_SAMPLES = 1000
+"""How many of the latest timings of each query template are kept to compute percentiles from."""
+
+current_command: ContextVar[t.Optional[str]] = ContextVar("current_command", default=None)
+"""The name of the command being invoked in the current task, reported with slow queries."""
+
+
+def percentile(values: t.Sequence[float], q: float) -> float:
+    """Get the q-th percentile of already sorted values, using the nearest-rank method."""
+    if not values:
+        return 0.0
+    return values[min(len(values), max(1, math.ceil(len(values) * q / 100))) - 1]
+
+
+@attr.frozen()
+class PoolStats:
+    """A snapshot of the usage of the database connection pool."""
+
+    size: int
+    """The number of open connections."""
+
+    max_size: int
+    """The maximum number of connections."""
+
+    in_use: int
+    """The number of connections currently acquired."""
+
+    idle: int
+    """The number of open connections not acquired."""
+
+    waiting: int
+    """The number of acquires currently waiting for a connection."""
+
+    acquires: int
+    """The number of connections acquired since the pool was created."""
+
+    wait_total: float
+    """Seconds spent waiting for the pool since it was created."""
+
+    wait_p50: float
+    """The median of the latest acquire wait times, in seconds."""
+
+    wait_p95: float
+    """The 95th percentile of the latest acquire wait times, in seconds."""
+
+    wait_p99: float
+    """The 99th percentile of the latest acquire wait times, in seconds."""
+
+    wait_max: float
+    """The longest of the latest acquire wait times, in seconds."""
+
+
+@attr.frozen()
+class QueryStats:
+    """The timings of one query template."""
+
+    query: str
+    """The normalized query, or the name of a registered statement."""
+
+    count: int
+    """How many times the query ran."""
+
+    total: float
+    """Seconds spent running the query."""
+
+    p50: float
+    """The median of the latest run times, in seconds."""
+
+    p95: float
+    """The 95th percentile of the latest run times, in seconds."""
+
+    p99: float
+    """The 99th percentile of the latest run times, in seconds."""
+
+    max: float
+    """The longest of the latest run times, in seconds."""
+
+
+class QueryTimings:
+    """Run times recorded for one query template."""
+
+    __slots__ = ("count", "total", "samples")
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.total: float = 0.0
+        self.samples: t.Deque[float] = deque(maxlen=QUERY_SAMPLES)
+
+    def add(self, elapsed: float) -> None:
+        self.count += 1
+        self.total += elapsed
+        self.samples.append(elapsed)
+
+
+@lru_cache(maxsize=1024)
+def normalize_query(query: str) -> str:
+    """Collapse the whitespace of a query so that differently formatted copies of it are timed together."""
+    return " ".join(query.split())
+
+
+class PreparedConnection(asyncpg.Connection):
+    """A pooled connection, holding the statements of the registry prepared on it."""
+
+    def __init__(self, *args: t.Any, **kwargs: t.Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.prepared: t.Dict[str, asyncpg.prepared_stmt.PreparedStatement] = {}
+
 
 class Database:
     """Объект базы данных, обертка для asyncpg pool с доп методами"""
@@ -29,7 +150,25 @@ class Database:
         self._port = int(os.getenv("POSTGRES_PORT") or 5432)
         self._password = os.environ["POSTGRES_PASSWORD"]
         self._version = os.getenv("POSTGRES_VERSION")
+        self._pool_min_size = int(os.getenv("POSTGRES_POOL_MIN_SIZE") or app.config.DB_POOL_MIN_SIZE)
+        self._pool_max_size = int(os.getenv("POSTGRES_POOL_MAX_SIZE") or app.config.DB_POOL_MAX_SIZE)
+        self._pool_max_idle = float(os.getenv("POSTGRES_POOL_MAX_IDLE") or app.config.DB_POOL_MAX_IDLE)
+        self._statement_cache_size = int(
+            os.getenv("POSTGRES_STATEMENT_CACHE_SIZE") or app.config.DB_STATEMENT_CACHE_SIZE
+        )
+        command_timeout = os.getenv("POSTGRES_COMMAND_TIMEOUT") or app.config.DB_COMMAND_TIMEOUT
+        self._command_timeout = float(command_timeout) if command_timeout else None
+        self._acquire_waits: t.Deque[float] = deque(maxlen=ACQUIRE_SAMPLES)
+        self._acquire_count: int = 0
+        self._acquire_wait_total: float = 0.0
+        self._acquire_waiting: int = 0
+        slow_query_threshold = os.getenv("POSTGRES_SLOW_QUERY_THRESHOLD") or app.config.DB_SLOW_QUERY_THRESHOLD
+        self._slow_query_threshold = float(slow_query_threshold) if slow_query_threshold else None
+        self._query_timings: t.Dict[str, QueryTimings] = {}
         self._pool: t.Optional[asyncpg.Pool] = None
+        self._listener_con: t.Optional[asyncpg.Connection] = None
+        self._listeners: t.Dict[str, t.List[t.Callable[[t.Optional[str]], t.Any]]] = {}
+        self._reconnect_task: t.Optional[asyncio.Task[None]] = None
         self._is_closed: bool = False
 
         DatabaseModel._db = self
@@ -80,7 +219,75 @@ class Database:
         if self._is_closed:
             raise DatabaseStateConflictError("The database is closed.")
 
-        self._pool = await asyncpg.create_pool(dsn=self.dsn)
+        self._pool = await asyncpg.create_pool(
+            dsn=self.dsn,
+            min_size=self._pool_min_size,
+            max_size=self._pool_max_size,
+            max_inactive_connection_lifetime=self._pool_max_idle,
+            statement_cache_size=self._statement_cache_size,
+            command_timeout=self._command_timeout,
+            connection_class=PreparedConnection,
+            init=self._prepare_statements,
+        )
+
+    async def _prepare_statements(self, con: PreparedConnection) -> None:
+        """Prepare every registered statement on a new pooled connection."""
+        for statement in STATEMENTS.values():
+            try:
+                con.prepared[statement.name] = await con.prepare(statement.query)
+            except asyncpg.PostgresError as e:
+                # The schema may not be up to date yet, the statement is prepared on first use instead
+                logger.debug(f"Failed preparing statement '{statement.name}': {e}")
+
+    async def prepared(self, con: asyncpg.Connection, statement: Statement) -> asyncpg.prepared_stmt.PreparedStatement:
+        """Get a registered statement prepared on an acquired connection.
+
+        Parameters
+        ----------
+        con : asyncpg.Connection
+            A connection acquired from the pool of this database.
+        statement : Statement
+            The registered statement to get.
+
+        Returns
+        -------
+        asyncpg.prepared_stmt.PreparedStatement
+            The statement, prepared on the connection.
+        """
+        prepared = con.prepared.get(statement.name)
+        if prepared is None:
+            prepared = con.prepared[statement.name] = await con.prepare(statement.query)
+        return prepared
+
+    async def _run_statement(
+        self,
+        statement: Statement,
+        method: str,
+        *args: t.Any,
+        con: t.Optional[asyncpg.Connection] = None,
+        **kwargs: t.Any,
+    ) -> t.Any:
+        """Run a registered statement with the given PreparedStatement method on a pooled connection."""
+        async with self._connection(con) as con:
+            with self._timed(statement):
+                try:
+                    return await self._call_prepared(con, statement, method, *args, **kwargs)
+                except asyncpg.InvalidCachedStatementError:
+                    # A failed transaction cannot be retried in, it is up to the caller to run it again
+                    if con.is_in_transaction():
+                        raise
+                    # The schema changed since the statement was prepared, prepare it again
+                    con.prepared.pop(statement.name, None)
+                    return await self._call_prepared(con, statement, method, *args, **kwargs)
+
+    async def _call_prepared(
+        self, con: asyncpg.Connection, statement: Statement, method: str, *args: t.Any, **kwargs: t.Any
+    ) -> t.Any:
+        prepared = await self.prepared(con, statement)
+        if method == "execute":
+            await prepared.fetch(*args, **kwargs)
+            return prepared.get_statusmsg()
+        return await getattr(prepared, method)(*args, **kwargs)
 
     async def close(self) -> None:
         """Close the connection pool."""
@@ -89,8 +296,10 @@ class Database:
         if self._is_closed:
             raise DatabaseStateConflictError("The database is closed.")
 
-        await self._pool.close()
         self._is_closed = True
+        if self._listener_con and not self._listener_con.is_closed():
+            await self._listener_con.close()
+        await self._pool.close()
 
     def terminate(self) -> None:
         """Terminate the connection pool."""
@@ -99,8 +308,10 @@ class Database:
         if self._is_closed:
             raise DatabaseStateConflictError("The database is closed.")
 
-        self._pool.terminate()
         self._is_closed = True
+        if self._listener_con and not self._listener_con.is_closed():
+            self._listener_con.terminate()
+        self._pool.terminate()
 
     @asynccontextmanager
     async def acquire(self) -> t.AsyncIterator[asyncpg.Connection]:
@@ -108,21 +319,206 @@ class Database:
         if not self._pool:
             raise DatabaseStateConflictError("The database is not connected.")
 
-        con = await self._pool.acquire()
+        self._acquire_waiting += 1
+        start = time.perf_counter()
+        try:
+            con = await self._pool.acquire()
+        finally:
+            self._acquire_waiting -= 1
+
+        waited = time.perf_counter() - start
+        self._acquire_waits.append(waited)
+        self._acquire_wait_total += waited
+        self._acquire_count += 1
         try:
             yield con
         finally:
             await self._pool.release(con)
 
-    async def execute(self, query: str, *args: object, timeout: t.Optional[float] = None) -> str:
+    @asynccontextmanager
+    async def _connection(self, con: t.Optional[asyncpg.Connection]) -> t.AsyncIterator[asyncpg.Connection]:
+        """Use the given connection, or acquire one from the pool if there is none."""
+        if con is not None:
+            yield con
+            return
+
+        async with self.acquire() as con:
+            yield con
+
+    @asynccontextmanager
+    async def transaction(self) -> t.AsyncIterator[asyncpg.Connection]:
+        """Acquire a database connection from the connection pool and start a transaction on it.
+
+        Pass the connection as `con` to the query methods to run them in the transaction,
+        which is committed when the block exits, or rolled back if it raises.
+        """
+        async with self.acquire() as con:
+            async with con.transaction():
+                yield con
+
+    def pool_stats(self) -> PoolStats:
+        """Get the current usage of the connection pool and the latest acquire wait times.
+
+        Returns
+        -------
+        PoolStats
+            A snapshot of the pool usage.
+
+        Raises
+        ------
+        DatabaseStateConflictError
+            The application is not connected to the database server.
+        """
+        if not self._pool:
+            raise DatabaseStateConflictError("The database is not connected.")
+
+        waits = sorted(self._acquire_waits)
+        size = self._pool.get_size()
+        idle = self._pool.get_idle_size()
+        return PoolStats(
+            size=size,
+            max_size=self._pool.get_max_size(),
+            in_use=size - idle,
+            idle=idle,
+            waiting=self._acquire_waiting,
+            acquires=self._acquire_count,
+            wait_total=self._acquire_wait_total,
+            wait_p50=percentile(waits, 50),
+            wait_p95=percentile(waits, 95),
+            wait_p99=percentile(waits, 99),
+            wait_max=waits[-1] if waits else 0.0,
+        )
+
+    @contextmanager
+    def _timed(self, query: t.Union[str, Statement]) -> t.Iterator[None]:
+        """Record the run time of the query in the enclosed block, and log it if it is slow."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            template = query.name if isinstance(query, Statement) else normalize_query(query)
+            timings = self._query_timings.get(template)
+            if timings is None:
+                timings = self._query_timings[template] = QueryTimings()
+            timings.add(elapsed)
+
+            if self._slow_query_threshold is not None and elapsed >= self._slow_query_threshold:
+                logger.warning(
+                    f"Slow query ({elapsed * 1000:.0f} ms) in command '{current_command.get() or 'N/A'}': {template}"
+                )
+
+    def query_stats(self) -> t.List[QueryStats]:
+        """Get the timings of every query template that ran since the last reset, by descending total time.
+
+        Returns
+        -------
+        List[QueryStats]
+            The timings of each query template.
+        """
+        stats = []
+        for template, timings in self._query_timings.items():
+            samples = sorted(timings.samples)
+            stats.append(
+                QueryStats(
+                    query=template,
+                    count=timings.count,
+                    total=timings.total,
+                    p50=percentile(samples, 50),
+                    p95=percentile(samples, 95),
+                    p99=percentile(samples, 99),
+                    max=samples[-1] if samples else 0.0,
+                )
+            )
+        return sorted(stats, key=lambda s: s.total, reverse=True)
+
+    def reset_query_stats(self) -> None:
+        """Forget the timings of every query."""
+        self._query_timings.clear()
+
+    async def listen(self, channel: str, callback: t.Callable[[t.Optional[str]], t.Any]) -> None:
+        """Subscribe to a PostgreSQL notification channel.
+
+        Notifications are received on a dedicated connection outside of the pool, which is
+        re-established if it is lost. Since notifications sent in the meantime are lost too,
+        every callback is then called once with `None` as the payload.
+
+        Parameters
+        ----------
+        channel : str
+            The name of the channel to LISTEN on.
+        callback : Callable[[Optional[str]], Any]
+            The function called with the payload of every notification on the channel.
+
+        Raises
+        ------
+        DatabaseStateConflictError
+            The application is not connected to the database server.
+        """
+        if not self._pool:
+            raise DatabaseStateConflictError("The database is not connected.")
+
+        if self._listener_con is None or self._listener_con.is_closed():
+            self._listener_con = await self._connect_listener()
+
+        if channel not in self._listeners:
+            self._listeners[channel] = []
+            await self._listener_con.add_listener(channel, self._dispatch_notification)
+
+        self._listeners[channel].append(callback)
+
+    async def _connect_listener(self) -> asyncpg.Connection:
+        con = await asyncpg.connect(dsn=self.dsn)
+        con.add_termination_listener(self._on_listener_terminated)
+        for channel in self._listeners:
+            await con.add_listener(channel, self._dispatch_notification)
+        return con
+
+    def _dispatch_notification(self, con: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        for callback in self._listeners.get(channel, []):
+            callback(payload)
+
+    def _on_listener_terminated(self, con: asyncpg.Connection) -> None:
+        if self._is_closed or con is not self._listener_con:
+            return
+
+        logger.warning("Lost the database notification connection, reconnecting...")
+        self._reconnect_task = asyncio.create_task(self._reconnect_listener())
+
+    async def _reconnect_listener(self) -> None:
+        delay = 1
+        while not self._is_closed:
+            try:
+                self._listener_con = await self._connect_listener()
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning(f"Failed reconnecting notification connection, retrying in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+                continue
+
+            logger.info("Database notification connection re-established.")
+            for callbacks in self._listeners.values():
+                for callback in callbacks:
+                    callback(None)
+            return
+
+    async def execute(
+        self,
+        query: t.Union[str, Statement],
+        *args: object,
+        timeout: t.Optional[float] = None,
+        con: t.Optional[asyncpg.Connection] = None,
+    ) -> str:
         """Execute an SQL command.
 
         Parameters
         ----------
-        query : str
-            The SQL query to run.
+        query : Union[str, Statement]
+            The SQL query or registered statement to run.
         timeout : Optional[float], optional
             The timeout in seconds, by default None
+        con : Optional[asyncpg.Connection], optional
+            The connection to run on, such as one from `transaction()`, by default one is acquired from the pool
 
         Returns
         -------
@@ -138,17 +534,30 @@ class Database:
         if not self._pool:
             raise DatabaseStateConflictError("The database is not connected.")
 
-        return await self._pool.execute(query, *args, timeout=timeout)  # type: ignore
+        if isinstance(query, Statement):
+            return await self._run_statement(query, "execute", *args, timeout=timeout, con=con)
+
+        async with self._connection(con) as con:
+            with self._timed(query):
+                return await con.execute(query, *args, timeout=timeout)
 
-    async def fetch(self, query: str, *args, timeout: t.Optional[float] = None) -> t.List[asyncpg.Record]:
+    async def fetch(
+        self,
+        query: t.Union[str, Statement],
+        *args,
+        timeout: t.Optional[float] = None,
+        con: t.Optional[asyncpg.Connection] = None,
+    ) -> t.List[asyncpg.Record]:
         """Выполнить запрос и вернуть список результатов типа `Record`.
 
         Parameters
         ----------
-        query : str
-            SQL запрос
+        query : Union[str, Statement]
+            SQL запрос или зарегистрированный запрос из `models.statements`
         timeout : Optional[float], optional
             Таймаут в секундах, по-умолчанию None
+        con : Optional[asyncpg.Connection], optional
+            Соединение для запроса, например из `transaction()`, по-умолчанию берется из пула
 
         Returns
         -------
@@ -163,19 +572,33 @@ class Database:
         if not self._pool:
             raise DatabaseStateConflictError("The database is not connected.")
 
-        return await self._pool.fetch(query, *args, timeout=timeout)
-
-    async def executemany(self, command: str, args: t.Tuple[t.Any], *, timeout: t.Optional[float] = None) -> str:
+        if isinstance(query, Statement):
+            return await self._run_statement(query, "fetch", *args, timeout=timeout, con=con)
+
+        async with self._connection(con) as con:
+            with self._timed(query):
+                return await con.fetch(query, *args, timeout=timeout)
+
+    async def executemany(
+        self,
+        command: t.Union[str, Statement],
+        args: t.Iterable[t.Sequence[t.Any]],
+        *,
+        timeout: t.Optional[float] = None,
+        con: t.Optional[asyncpg.Connection] = None,
+    ) -> str:
         """Execute an SQL command for each sequence of arguments in `args`.
 
         Parameters
         ----------
-        query : str
-            The SQL query to run.
+        query : Union[str, Statement]
+            The SQL query or registered statement to run.
         args : Tuple[t.Any]
             Tuples of arguments to execute.
         timeout : Optional[float], optional
             The timeout in seconds, by default None
+        con : Optional[asyncpg.Connection], optional
+            The connection to run on, such as one from `transaction()`, by default one is acquired from the pool
 
         Returns
         -------
@@ -190,17 +613,30 @@ class Database:
         if not self._pool:
             raise DatabaseStateConflictError("The database is not connected.")
 
-        return await self._pool.executemany(command, args, timeout=timeout)  # type: ignore
+        if isinstance(command, Statement):
+            return await self._run_statement(command, "executemany", args, timeout=timeout, con=con)
+
+        async with self._connection(con) as con:
+            with self._timed(command):
+                return await con.executemany(command, args, timeout=timeout)
 
-    async def fetchrow(self, query: str, *args, timeout: t.Optional[float] = None) -> asyncpg.Record:
+    async def fetchrow(
+        self,
+        query: t.Union[str, Statement],
+        *args,
+        timeout: t.Optional[float] = None,
+        con: t.Optional[asyncpg.Connection] = None,
+    ) -> asyncpg.Record:
         """Run a query and return the first row that matched query parameters.
 
         Parameters
         ----------
-        query : str
-            The SQL query to be ran.
+        query : Union[str, Statement]
+            The SQL query or registered statement to be ran.
         timeout : t.Optional[float], optional
             The timeout in seconds, by default None
+        con : Optional[asyncpg.Connection], optional
+            The connection to run on, such as one from `transaction()`, by default one is acquired from the pool
 
         Returns
         -------
@@ -215,17 +651,31 @@ class Database:
         if not self._pool:
             raise DatabaseStateConflictError("The database is not connected.")
 
-        return await self._pool.fetchrow(query, *args, timeout=timeout)
-
-    async def fetchval(self, query: str, *args, column: int = 0, timeout: t.Optional[float] = None) -> t.Any:
+        if isinstance(query, Statement):
+            return await self._run_statement(query, "fetchrow", *args, timeout=timeout, con=con)
+
+        async with self._connection(con) as con:
+            with self._timed(query):
+                return await con.fetchrow(query, *args, timeout=timeout)
+
+    async def fetchval(
+        self,
+        query: t.Union[str, Statement],
+        *args,
+        column: int = 0,
+        timeout: t.Optional[float] = None,
+        con: t.Optional[asyncpg.Connection] = None,
+    ) -> t.Any:
         """Run a query and return a value in the first row that matched query parameters.
 
         Parameters
         ----------
-        query : str
-            The SQL query to be ran.
+        query : Union[str, Statement]
+            The SQL query or registered statement to be ran.
         timeout : t.Optional[float], optional
             The timeout in seconds, by default None
+        con : Optional[asyncpg.Connection], optional
+            The connection to run on, such as one from `transaction()`, by default one is acquired from the pool
 
         Returns
         -------
@@ -240,7 +690,12 @@ class Database:
         if not self._pool:
             raise DatabaseStateConflictError("The database is not connected.")
 
-        return await self._pool.fetchval(query, *args, column=column, timeout=timeout)
+        if isinstance(query, Statement):
+            return await self._run_statement(query, "fetchval", *args, column=column, timeout=timeout, con=con)
+
+        async with self._connection(con) as con:
+            with self._timed(query):
+                return await con.fetchval(query, *args, column=column, timeout=timeout)
 
     async def wipe_guild(self, guild: hikari.SnowflakeishOr[hikari.PartialGuild], *, keep_record: bool = True) -> None:
         if not self._pool:
@@ -268,18 +723,20 @@ class Database:
             if not isinstance(schema_version, int):
                 raise ValueError(f"Schema version not found or invalid. Expected integer, found '{schema_version}'.")
 
-            for filename in sorted(os.listdir(os.path.join(self._app.base_dir, "db", "migrations"))):
+            migrations: t.List[t.Tuple[int, str]] = []
+            for filename in os.listdir(os.path.join(self._app.base_dir, "db", "migrations")):
                 if not filename.endswith(".sql"):
                     continue
 
                 try:
-                    migration_version = int(filename[:-4])
+                    migrations.append((int(filename[:-4]), filename))
                 except ValueError:
                     logger.warning(
                         f"Invalid migration file found: '{filename}' Migration filenames must be integers and have a '.sql' extension."
                     )
-                    continue
 
+            # Sort by version, sorted by name 10.sql would be applied before 2.sql
+            for migration_version, filename in sorted(migrations):
                 path = os.path.join(self._app.base_dir, "db", "migrations", filename)
 
                 if migration_version <= schema_version or not os.path.isfile(path):
@@ -291,6 +748,9 @@ class Database:
                 await con.execute("""UPDATE schema_info SET schema_version = $1""", migration_version)
                 logger.info(f"Applied database migration: '{filename}'")
 
+        # Statements prepared before the schema was updated may be outdated or missing
+        await self._pool.expire_connections()
+
         logger.info("Database schema is up to date!")
 
 
@@ -300,6 +760,7 @@ class DatabaseModel(abc.ABC):
     _db: Database
     _app: SamuroBot
     _db_cache: DatabaseCache
+    _rankings: RankingIndex
 
 
 # by fenrir#5455
@@ -103,4 +103,16 @@ class HasActiveEvent(Exception):
     """
 
 
+class DuplicateRooms(Exception):
+    """
+    Одна комната указана несколько раз
+    """
+
+
+class AlreadyQueued(Exception):
+    """
+    Игрок уже в очереди на матч
+    """
+
+
 # by fenrir#5455
@@ -1,19 +1,24 @@
 import enum
 import logging
+import typing as t
+import unicodedata
 from datetime import datetime
 from difflib import get_close_matches
 
+import asyncpg
 import attr
 import hikari
-import lightbulb.utils
 import requests
 from bs4 import BeautifulSoup
 
 from etc import constants as const
 from models import errors
+from models import statements
 from models.context import SamuroSlashContext
 from models.db import DatabaseModel
+from models.views import KeysetPageSource
 from utils import hots as util
+from utils import scoring
 from utils.hots import EventWinner
 
 # TODO при переносе на сервер не забыть начать ивенты с 411
@@ -23,6 +28,51 @@ logger = logging.getLogger(__name__)
 
 bug_names = {"Deckard Cain": "Deckard", "Lúcio": "Lucio"}
 
+
+def normalize_hero_name(name: str) -> str:
+    """Имя героя для поиска: без диакритики, пробелов, знаков препинания и без учета регистра"""
+    decomposed = unicodedata.normalize("NFKD", name)
+    return "".join(char for char in decomposed if char.isalnum()).casefold()
+
+
+def _build_hero_aliases() -> t.Dict[str, str]:
+    aliases: t.Dict[str, str] = {}
+    for hero, data in const.ru_heroesdata.items():
+        for alias in (hero, data["name_en"], data["name_ru"], *data["nick"]):
+            if alias:
+                aliases[normalize_hero_name(alias)] = data["name_id"]
+
+    for alias, name in bug_names.items():
+        hero_id = aliases.get(normalize_hero_name(name))
+        if hero_id is not None:
+            aliases.setdefault(normalize_hero_name(alias), hero_id)
+    return aliases
+
+
+hero_aliases: t.Dict[str, str] = _build_hero_aliases()
+"""Все имена и прозвища героев после `normalize_hero_name`, с `name_id` героя"""
+
+
+def find_hero_id(name: str) -> str:
+    """
+    `name_id` героя по имени на любом языке или прозвищу.
+    Сначала ищет точное совпадение в `hero_aliases`, и только если его нет - ближайшее похожее имя.
+
+    :param name: Имя или прозвище героя
+    :return: `name_id` героя
+    :raises errors.HeroNotFound: Нет похожих имен
+    """
+    key = normalize_hero_name(name)
+    hero_id = hero_aliases.get(key)
+    if hero_id is not None:
+        return hero_id
+
+    matches = get_close_matches(key, hero_aliases, 1)
+    if not matches:
+        raise errors.HeroNotFound
+    return hero_aliases[matches[0]]
+
+
 all_heroes = const.all_heroes
 
 leagues = {
@@ -36,6 +86,7 @@ leagues = {
 }
 
 f_time = "%Y-%m-%d %H:%M:%S"
+MAX_EVENT_ID = 2_147_483_647  # event_id is a serial
 
 
 class HeroLeagues(str, enum.Enum):
@@ -86,18 +137,30 @@ def sort_by_mmr(player):
     return player.mmr
 
 
-async def fix_league_by_mmr(ctx: SamuroSlashContext):
-    """Редактирование лиги игрока на основе ММР"""
-    records = await ctx.app.db.fetch(
-        """
-        SELECT * FROM players
-        """
+async def fix_league_by_mmr(ctx: SamuroSlashContext) -> int:
+    """Редактирование лиги игрока на основе ММР, одним запросом для всех игроков
+
+    Returns
+    -------
+    int
+        Количество игроков, у которых изменилась лига или дивизион.
+    """
+    divisions = [league_division.split(sep=".") for league_division in util.flatten_mmr]
+    thresholds = (
+        [league for league, _ in divisions],
+        [int(division) for _, division in divisions],
+        list(util.flatten_mmr.values()),
     )
-    for record in records:
-        guild_id = int(record.get("guild_id"))
-        member_id = int(record.get("id"))
-        player = await HotsPlayer.fetch(member_id, guild_id)
-        await player.update()
+
+    rankings = []
+    async with ctx.app.db.transaction() as con:
+        records = await ctx.app.db.fetch(statements.PLAYERS_FIX_LEAGUES, *thresholds, con=con)
+        if records:
+            changed = [record.get("id") for record in records]
+            rankings = await ctx.app.db.fetch(statements.REFRESH_PLAYERS_RANKINGS, changed, con=con)
+
+    await ctx.app.rankings.update_records(rankings)
+    return len(records)
 
 
 async def matchmaking_5x5(ctx: SamuroSlashContext, type: str, players_str: str, manual: bool = False):
@@ -105,34 +168,89 @@ async def matchmaking_5x5(ctx: SamuroSlashContext, type: str, players_str: str,
 
     players_id = util.players_parse(players_str)
     players = []
-    unique_mmr = []
     members = []
     for p_id in players_id:
         member = ctx.get_guild().get_member(p_id)
         members.append(member)
     check_type(type, members)
-    for member in members:
-        player = await HotsPlayer.fetch(member, ctx.guild_id)
+    for player in await HotsPlayer.fetch_many(members, ctx.guild_id):
         if not player.blocked:
             players.append(player)
         else:
             raise errors.UserBlacklistedError(f"{player.battle_tag} заблокирован и не может принимать участие")
-        while player.mmr in unique_mmr:
-            player.mmr += 1
-        unique_mmr.append(player.mmr)
     if not manual:
         players.sort(key=sort_by_mmr, reverse=True)
-        team_one_mmr, team_two_mmr = util.min_diff_sets([player.mmr for index, player in enumerate(players[:-2])])
-        team_one_mmr += (players[-1].mmr,)
-        team_two_mmr += (players[-2].mmr,)
-        team_one = [player for player in players if player.mmr in team_one_mmr]
-        team_two = [player for player in players if player.mmr in team_two_mmr]
+        team_one_ids, team_two_ids = util.balanced_teams([player.mmr for player in players])
+        team_one = [players[index] for index in team_one_ids]
+        team_two = [players[index] for index in team_two_ids]
     else:
         team_one = [player for player in players[:5]]
         team_two = [player for player in players[5:]]
     return team_one, team_two
 
 
+async def matchmaking_lobbies(
+    ctx: SamuroSlashContext, players_str: str, max_lobbies: int
+) -> t.List[t.Tuple[t.List["HotsPlayer"], t.List["HotsPlayer"]]]:
+    """Подбор нескольких лобби 5х5 из пула игроков
+
+    Лобби создается столько, на сколько хватает игроков, но не больше `max_lobbies`.
+    Лишние игроки, записавшиеся последними, остаются в запасе.
+    """
+    members = [ctx.get_guild().get_member(p_id) for p_id in util.players_parse(players_str)]
+    lobby_size = 10
+    lobbies = min(len(members) // lobby_size, max_lobbies)
+    if not lobbies:
+        raise errors.BadPlayersCount
+
+    players = await HotsPlayer.fetch_many(members[: lobbies * lobby_size], ctx.guild_id)
+    for player in players:
+        if player.blocked:
+            raise errors.UserBlacklistedError(f"{player.battle_tag} заблокирован и не может принимать участие")
+
+    splits = util.balanced_lobbies(
+        [player.mmr for player in players],
+        team_size=lobby_size // 2,
+        time_budget=ctx.app.config.MATCHMAKING_TIME_BUDGET,
+    )
+    return [([players[index] for index in blue], [players[index] for index in red]) for blue, red in splits]
+
+
+async def lobby_splits(
+    ctx: SamuroSlashContext, players_str: str, top: int = 5
+) -> t.Tuple[t.List["HotsPlayer"], t.List[scoring.ScoredSplit]]:
+    """Лучшие разбиения лобби на команды по ММР, лигам, винстрикам и повторам союзников, для выбора ведущим"""
+    members = [ctx.get_guild().get_member(p_id) for p_id in util.players_parse(players_str)]
+    check_type(EventTypes.event5x5, members)
+    players = await HotsPlayer.fetch_many(members, ctx.guild_id)
+
+    positions = {player.id: position for position, player in enumerate(players)}
+    teammates = [[0] * len(players) for _ in players]
+    for record in await ctx.app.db.fetch(statements.LOBBY_TEAMMATES, ctx.guild_id, list(positions)):
+        a, b = positions[record.get("player_a")], positions[record.get("player_b")]
+        teammates[a][b] = teammates[b][a] = record.get("together")
+
+    league_order = list(leagues.values())
+    stats = scoring.LobbyStats(
+        mmr=[player.mmr for player in players],
+        leagues=[league_order.index(player.league) if player.league in league_order else 0 for player in players],
+        winstreaks=[player.stats.winstreak if player.stats else 0 for player in players],
+        teammates=teammates,
+    )
+    return players, scoring.score_splits(stats, top=top)
+
+
+async def get_season(guild: hikari.SnowflakeishOr[hikari.PartialGuild]) -> t.Optional[str]:
+    """Текущий сезон сервера из кэша `global_config`, без запроса к базе при каждом вызове"""
+    guild_id = hikari.Snowflake(guild)
+    if not DatabaseModel._db_cache.is_ready:
+        return await DatabaseModel._db.fetchval(statements.GUILD_SEASON, guild_id)
+
+    # Сервера без записи в `global_config` запоминаются кэшем как промах
+    records = await DatabaseModel._db_cache.get(table="global_config", guild_id=guild_id, limit=1)
+    return records[0].get("season") if records else None
+
+
 async def _has_active_event(ctx: SamuroSlashContext):
     """Проверка наличия активного события в комнате"""
 
@@ -151,19 +269,19 @@ async def _has_active_event(ctx: SamuroSlashContext):
 class HotsHero:
     """Класс игрового героя"""
 
-    def __init__(self, name: str):
-        flag = False
-        heroes_ru_list = const.ru_heroesdata
-        name = name.title()
-        name = get_close_matches(name, const.all_heroes, 2)[0]
-        for hero, data in heroes_ru_list.items():
-            if name in bug_names:
-                name = bug_names[name]
-            if name == data["name_en"] or name == data["name_ru"] or name == hero or name in data["nick"]:
-                flag = True
-                break  # вышли из цикла чтобы записать значение
-        if not flag:
-            raise errors.HeroNotFound
+    _instances: t.Dict[str, "HotsHero"] = {}
+    """Созданные герои по `name_id`, каждый герой собирается один раз и дальше переиспользуется"""
+
+    def __new__(cls, name: str) -> "HotsHero":
+        hero_id = find_hero_id(name)
+        hero = cls._instances.get(hero_id)
+        if hero is None:
+            hero = super().__new__(cls)
+            hero._load(const.ru_heroesdata[hero_id])
+            cls._instances[hero_id] = hero
+        return hero
+
+    def _load(self, data: dict) -> None:
         self.id: str = data["name_id"]
         self.en: str = data["name_en"]
         self.ru: str = data["name_ru"]
@@ -338,13 +456,9 @@ class PlayerStats(DatabaseModel):
     season: str = const.hots_season
     achievements: list = None
 
-    async def update(self):
-        await self._db.execute(
-            """
-            INSERT INTO players_stats (id, guild_id, btag, season, points, win, lose, winstreak, max_ws)
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-            ON CONFLICT (id, guild_id, season) DO
-            UPDATE SET points = $5, win = $6, lose = $7, winstreak = $8, max_ws = $9""",
+    def as_row(self) -> t.Tuple[t.Any, ...]:
+        """Аргументы запроса `PLAYER_STATS_UPSERT` для этой статистики"""
+        return (
             self.id,
             self.guild_id,
             self.battle_tag,
@@ -356,6 +470,18 @@ class PlayerStats(DatabaseModel):
             self.max_ws,
         )
 
+    def add_result(self, winner: bool, points: int) -> None:
+        """Учесть результат матча в статистике, без записи в базу"""
+        if winner:
+            self.winstreak = self.winstreak + 1 if self.winstreak >= 0 else 1
+            self.win += 1
+            if self.winstreak > self.max_ws:
+                self.max_ws = self.winstreak
+        else:
+            self.winstreak = self.winstreak - 1 if self.winstreak <= 0 else -1
+            self.lose += 1
+        self.points += points
+
     @classmethod
     async def clear(
         cls,
@@ -382,16 +508,9 @@ class PlayerStats(DatabaseModel):
         guild: hikari.SnowflakeishOr[hikari.PartialGuild],
         btag: str,
     ) -> None:
-        season = await cls._db.fetchval(
-            """
-            SELECT season FROM global_config where guild_id = $1
-            """,
-            hikari.Snowflake(guild),
-        )
+        season = await get_season(guild)
         record = await cls._db.fetchrow(
-            """
-            SELECT * FROM players_stats WHERE id = $1 AND guild_id = $2 AND btag = btag AND season = $3
-            """,
+            statements.PLAYER_STATS,
             hikari.Snowflake(user),
             hikari.Snowflake(guild),
             season,
@@ -410,12 +529,7 @@ class PlayerStats(DatabaseModel):
                 achievements=None,
             )
         achievements = await cls._db.fetch(
-            """
-            SELECT ua.id, a.name, ua.timestamp FROM user_achievements as ua
-                    INNER JOIN achievements as a
-                    ON ua.achievement = a.id
-                    WHERE ua.id = $1 AND ua.guild_id = $2 AND ( season = $3 OR season = 'ALL' )
-            """,
+            statements.PLAYER_ACHIEVEMENTS,
             hikari.Snowflake(user),
             hikari.Snowflake(guild),
             season,
@@ -433,6 +547,32 @@ class PlayerStats(DatabaseModel):
             achievements=achievements,
         )
 
+    @classmethod
+    def from_player_record(
+        cls, record: asyncpg.Record, guild: hikari.Snowflake, season: str, achievements: t.Optional[list]
+    ) -> "PlayerStats":
+        """Статистика из записи игрока, объединенной со статистикой запросом `PLAYERS_BY_IDS`/`PLAYERS_BY_BTAGS`"""
+        if record.get("stats_season") is None:
+            return cls(
+                hikari.Snowflake(record.get("id")),
+                guild,
+                battle_tag=record.get("btag"),
+                season=season,
+                achievements=None,
+            )
+        return cls(
+            id=hikari.Snowflake(record.get("id")),
+            guild_id=guild,
+            battle_tag=record.get("stats_btag"),
+            points=record.get("points"),
+            win=record.get("win"),
+            lose=record.get("lose"),
+            winstreak=record.get("winstreak"),
+            max_ws=record.get("max_ws"),
+            season=record.get("stats_season"),
+            achievements=achievements or [],
+        )
+
 
 @attr.define()
 class HotsPlayer(DatabaseModel):
@@ -449,34 +589,23 @@ class HotsPlayer(DatabaseModel):
     blocked: bool = False
     stats: PlayerStats = None
 
-    async def log_page(self) -> list[hikari.Embed]:
-        records = await self._db.fetch(
-            """
-            SELECT * FROM event_log WHERE id = $1
-            ORDER BY event_id DESC 
-            """,
-            self.id,
-        )
-
-        if not records:
-            raise errors.DontHaveLogs
-
-        paginator = lightbulb.utils.StringPaginator(max_chars=400)
+    async def log_source(self) -> "PlayerLogSource":
+        """Get the match history of the player as a page source, that loads one page at a time.
 
-        for record in records:
-            mmr = str(record.get("delta_mmr"))
-            if mmr != "0":
-                mmr = "+" + mmr if record.get("winner") else "-" + mmr
-            result = const.EMOJI_GREEN_UP if record.get("winner") else const.EMOJI_RED_DOWN
-            paginator.add_line(f"{result} ID: {record.get('event_id')} {record.get('map')} ({mmr})")
+        Returns
+        -------
+        PlayerLogSource
+            The match history of the player.
 
-        embeds = [
-            hikari.Embed(
-                title=f"Матчи {self.battle_tag}\nРезультат, ID, Карта, ММР", description=page, color=const.EMBED_BLUE
-            ).set_thumbnail(self.member.avatar_url)
-            for page in paginator.build_pages()
-        ]
-        return embeds
+        Raises
+        ------
+        errors.DontHaveLogs
+            The player has not played any matches.
+        """
+        source = PlayerLogSource(self)
+        if not await source.get_row_count():
+            raise errors.DontHaveLogs
+        return source
 
     async def profile(self) -> hikari.Embed:
         league = (
@@ -520,28 +649,9 @@ class HotsPlayer(DatabaseModel):
     async def add_stats_info(self, embed: hikari.Embed) -> hikari.Embed:
         league_rating = ""
         # Позиция в рейтинге
-        record = await self._db.fetchrow(
-            """
-            SELECT *
-            FROM (SELECT A.*,
-                         row_number() over (
-                             ORDER BY mmr DESC
-                             ) as league_rating
-                  FROM players as A
-                INNER JOIN players_stats as B
-                    ON A.id = B.id
-                    AND A.guild_id = B.guild_id
-                INNER JOIN global_config gc
-                    ON B.guild_id = gc.guild_id
-                    AND B.season = gc.season
-                WHERE A.league = $1) AS pl
-            WHERE pl.id = $2
-            """,
-            HeroLeagues(self.league).name.capitalize(),
-            self.id,
-        )
-        if record:
-            league_rating = f"• Позиция в лиге _{self.league}_: `{record.get('league_rating')}`"
+        ranking = await self._rankings.get(self.stats.guild_id, self.stats.season)
+        if (position := ranking.league_mmr_rank(self.id)) is not None:
+            league_rating = f"• Позиция в лиге _{self.league}_: `{position}`"
 
         embed.add_field(
             name=f"Текущий сезон: {self.stats.season}",
@@ -554,19 +664,8 @@ class HotsPlayer(DatabaseModel):
         )
 
         # Ставки
-        records = await self._db.fetch(
-            """
-            SELECT * FROM vote_log WHERE id = $1
-            """,
-            self.id,
-        )
-        correct = 0
-        wrong = 0
-        for record in records:
-            if record.get("won"):
-                correct += 1
-            else:
-                wrong += 1
+        record = await self._db.fetchrow(statements.PLAYER_VOTES, self.id)
+        correct, wrong = record.get("correct"), record.get("wrong")
         if correct > 0 and wrong > 0:
             round(correct / (correct + wrong) * 100)
             embed.add_field(
@@ -584,35 +683,16 @@ class HotsPlayer(DatabaseModel):
         embed.add_field(name="Достижения", value=text)
         return embed
 
+    def as_row(self) -> t.Tuple[t.Any, ...]:
+        """Аргументы запроса `PLAYER_UPSERT` для этого игрока"""
+        return (self.id, self.guild_id, self.battle_tag, self.mmr, self.league, self.division, self.blocked)
+
     async def update(self) -> None:
         self.league, self.division = self.get_league_division()
-        await self._db.execute(
-            """
-            INSERT INTO players (id, guild_id, btag, mmr, league, division, blocked)
-            VALUES ($1, $2, $3, $4, $5, $6, $7)
-            ON CONFLICT (id) DO
-            UPDATE SET guild_id = $2, btag = $3, mmr = $4, league = $5, division = $6, blocked = $7""",
-            self.id,
-            self.guild_id,
-            self.battle_tag,
-            self.mmr,
-            self.league,
-            self.division,
-            self.blocked,
-        )
-
-    async def update_stats(self, winner: bool, points: int) -> None:
-        if winner:
-            self.stats.winstreak = self.stats.winstreak + 1 if self.stats.winstreak >= 0 else 1
-            self.stats.win += 1
-            if self.stats.winstreak > self.stats.max_ws:
-                self.stats.max_ws = self.stats.winstreak
-            self.stats.points += points
-        else:
-            self.stats.winstreak = self.stats.winstreak - 1 if self.stats.winstreak <= 0 else -1
-            self.stats.lose += 1
-            self.stats.points += points
-        await self.stats.update()
+        async with self._db.transaction() as con:
+            await self._db.execute(statements.PLAYER_UPSERT, *self.as_row(), con=con)
+            rankings = await self._db.fetch(statements.REFRESH_PLAYERS_RANKINGS, [self.id], con=con)
+        await self._rankings.update_records(rankings)
 
     def fix_mmr(self, mmr: int) -> int:
         delta = 0
@@ -631,41 +711,28 @@ class HotsPlayer(DatabaseModel):
         )
         return league, int(division)
 
-    async def add_log(
+    def log_row(
         self, event_id: int, winner: bool, mmr: int, points: int, map: str, type: str = EventTypes.event5x5
-    ):
-        await self._db.execute(
-            """INSERT INTO event_log (id, guild_id, event_id, winner, points, delta_mmr, map, season, type) 
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-            ON CONFLICT (id, guild_id, event_id, season) DO UPDATE 
-            SET winner = $4, points = $5, delta_mmr = $6, season = $8, type = $9
-            """,
-            self.id,
-            self.stats.guild_id,
-            event_id,
-            winner,
-            points,
-            mmr,
-            map,
-            self.stats.season,
-            type,
-        )
+    ) -> t.Tuple[t.Any, ...]:
+        """Аргументы запроса `EVENT_LOG_UPSERT` для записи игрока в логе матча"""
+        return (self.id, self.stats.guild_id, event_id, winner, points, mmr, map, self.stats.season, type)
+
+    def end_5x5(self, mmr: int, points: int, winner: bool) -> int:
+        """Учесть результат рейтингового матча в статистике и ммр игрока, без записи в базу.
 
-    async def ending_5x5(self, event_id: int, mmr: int, points: int, winner: bool, map: str) -> None:
-        await self.update_stats(winner=winner, points=points)
+        Returns
+        -------
+        int
+            Изменение ммр игрока с учетом серии побед/поражений
+        """
+        self.stats.add_result(winner=winner, points=points)
         mmr = self.fix_mmr(mmr=mmr)
         if winner:
             self.mmr += mmr
         else:
             self.mmr -= mmr
         self.league, self.division = self.get_league_division()
-        await self.update()
-
-        await self.add_log(event_id=event_id, winner=winner, mmr=mmr, points=points, map=map)
-
-    async def ending_unranked(self, event_id: int, mmr: int, points: int, winner: bool, map: str, type: str) -> None:
-        await self.update_stats(winner=winner, points=points)
-        await self.add_log(event_id=event_id, winner=winner, mmr=mmr, points=points, map=map, type=type)
+        return mmr
 
     async def read_mmr(self, battletag: str) -> int:
         mmr_url = None
@@ -712,20 +779,20 @@ class HotsPlayer(DatabaseModel):
             )
 
         pl2 = await HotsPlayer.fetch(player2, self.guild_id)
-        records = await self._db.fetch(
-            """
-            SELECT A.id, A.winner, A.event_id, B.id, B.winner FROM
-                (SELECT * FROM event_log WHERE id=$1) AS A
-            INNER JOIN
-                (SELECT * FROM event_log WHERE id=$2) AS B
-                    ON A.event_id = B.event_id
-                ORDER BY A.event_id DESC
-            """,
-            self.id,
-            pl2.id,
-        )
+        player_a, player_b = sorted((self.id, pl2.id))
+        record = await self._db.fetchrow(statements.HEAD_TO_HEAD, self.guild_id, player_a, player_b)
 
-        if not records:
+        if record:
+            win_together = record.get("together_wins")
+            lose_together = record.get("together_losses")
+            # Победы одного из пары - поражения другого
+            if self.id == player_a:
+                win_versus, lose_versus = record.get("a_versus_wins"), record.get("b_versus_wins")
+            else:
+                win_versus, lose_versus = record.get("b_versus_wins"), record.get("a_versus_wins")
+            total = win_together + lose_together + win_versus + lose_versus
+
+        if not record or not total:
             return hikari.Embed(
                 title=f"🔍 История матчей с {pl2.battle_tag}",
                 description="Общих игр не найдено",
@@ -733,29 +800,9 @@ class HotsPlayer(DatabaseModel):
             )
 
         else:
-            win_together = 0
-            lose_together = 0
-            win_versus = 0
-            lose_versus = 0
-            for record in records:
-                values = list(record.values())
-                values[0]
-                a_winner = values[1]
-                values[2]
-                values[3]
-                b_winner = values[4]
-                if a_winner and b_winner:
-                    win_together += 1
-                elif a_winner and not b_winner:
-                    win_versus += 1
-                elif not a_winner and b_winner:
-                    lose_versus += 1
-                elif not a_winner and not b_winner:
-                    lose_together += 1
-
             embed = hikari.Embed(
                 title=f"🔍 История матчей с {pl2.battle_tag}",
-                description=f"Общее количество матчей - `{len(records)}`",
+                description=f"Общее количество матчей - `{total}`",
                 color=const.EMBED_BLUE,
             )
             embed.add_field(
@@ -784,19 +831,24 @@ class HotsPlayer(DatabaseModel):
         profile.mmr = mmr
         profile.league, profile.division = profile.get_league_division()
 
-        await cls._db.execute(
-            """
-            INSERT INTO players (btag, id, guild_id, mmr, league, division)
-            VALUES ($1, $2, $3, $4, $5, $6)
-            ON CONFLICT (id) DO NOTHING
-            """,
-            battletag,
-            profile.id,
-            profile.guild_id,
-            profile.mmr,
-            profile.league,
-            profile.division,
-        )
+        async with cls._db.transaction() as con:
+            await cls._db.execute(
+                """
+                INSERT INTO players (btag, id, guild_id, mmr, league, division)
+                VALUES ($1, $2, $3, $4, $5, $6)
+                ON CONFLICT (id) DO NOTHING
+                """,
+                battletag,
+                profile.id,
+                profile.guild_id,
+                profile.mmr,
+                profile.league,
+                profile.division,
+                con=con,
+            )
+            # Статистика прошлых сезонов остается после удаления профиля и снова попадает в рейтинг
+            rankings = await cls._db.fetch(statements.REFRESH_PLAYERS_RANKINGS, [profile.id], con=con)
+        await cls._rankings.update_records(rankings)
 
         # дозаполнить данные
         profile.league = leagues.get(profile.league)
@@ -821,15 +873,9 @@ class HotsPlayer(DatabaseModel):
             An object representing stored user data.
         """
         if isinstance(user, hikari.Member):
-            record = await cls._db.fetchrow(
-                """SELECT * FROM players WHERE id = $1""",
-                user.id,
-            )
+            record = await cls._db.fetchrow(statements.PLAYER_BY_ID, user.id)
         else:
-            record = await cls._db.fetchrow(
-                """SELECT * FROM players WHERE id = $1""",
-                user,
-            )
+            record = await cls._db.fetchrow(statements.PLAYER_BY_ID, user)
         # TODO: Получение профиля с heroesprofile
 
         if not record:
@@ -853,42 +899,119 @@ class HotsPlayer(DatabaseModel):
         )
 
     @classmethod
-    async def btag_fetch(cls, battle_tag: str, guild: hikari.SnowflakeishOr[hikari.PartialGuild]):
-        """Fetch a user from the database. If not present, returns a default DatabaseUser object.
+    async def fetch_many(
+        cls,
+        users: t.Sequence[hikari.Member | int],
+        guild_id: hikari.SnowflakeishOr[hikari.PartialGuild],
+        missing_ok: bool = False,
+    ) -> t.List["HotsPlayer"]:
+        """Fetch several players at once, such as a whole lobby, in two queries.
 
         Parameters
         ----------
-        user : hikari.SnowflakeishOr[hikari.PartialUser]
-            The user to retrieve database information for.
-        guild : hikari.SnowflakeishOr[hikari.PartialGuild]
-            The guild the user belongs to.
+        users : Sequence[hikari.Member | int]
+            The users to retrieve players for.
+        guild_id : hikari.SnowflakeishOr[hikari.PartialGuild]
+            The guild the users belong to.
+        missing_ok : bool
+            Skip users without a profile instead of raising, by default False
 
         Returns
         -------
-        DatabaseUser
-            An object representing stored user data.
+        List[HotsPlayer]
+            The players, in the order of `users`.
+
+        Raises
+        ------
+        errors.ProfileNotFound
+            One of the users does not have a profile and `missing_ok` is False.
         """
-        record = await cls._db.fetchrow(
-            """SELECT * FROM players WHERE btag = $1""",
-            battle_tag,
+        guild = hikari.Snowflake(guild_id)
+        ids = [int(user.id) if isinstance(user, hikari.Member) else int(user) for user in users]
+        season = await get_season(guild)
+        records = {
+            record.get("id"): record for record in await cls._db.fetch(statements.PLAYERS_BY_IDS, ids, guild, season)
+        }
+
+        for user_id in ids:
+            if user_id not in records and not missing_ok:
+                logger.warning(f"Попытка посмотреть несуществующий профиль id={user_id}")
+                raise errors.ProfileNotFound(f"Нет профиля <@{user_id}>")
+
+        found = [(user, user_id) for user, user_id in zip(users, ids) if user_id in records]
+        return await cls._from_records(
+            [records[user_id] for _, user_id in found], [user for user, _ in found], guild, season
         )
 
-        if not record:
-            raise errors.ProfileNotFound(f"Нет профиля {battle_tag}")
+    @classmethod
+    async def btag_fetch_many(
+        cls, battle_tags: t.Sequence[str], guild: hikari.SnowflakeishOr[hikari.PartialGuild]
+    ) -> t.List["HotsPlayer"]:
+        """Fetch several players at once by their battle tags, such as a whole lobby, in two queries.
 
-        return cls(
-            member=None,
-            id=hikari.Snowflake(record.get("id")),
-            guild_id=hikari.Snowflake(record.get("guild_id")),
-            mention=f"<@{record.get('id')}>",
-            battle_tag=record.get("btag"),
-            mmr=record.get("mmr"),
-            league=leagues.get(record.get("league")),
-            division=record.get("division"),
-            stats=await PlayerStats.fetch(record.get("id"), guild, record.get("btag")),
-            blocked=record.get("blocked"),
+        Parameters
+        ----------
+        battle_tags : Sequence[str]
+            The battle tags to retrieve players for.
+        guild : hikari.SnowflakeishOr[hikari.PartialGuild]
+            The guild the players belong to.
+
+        Returns
+        -------
+        List[HotsPlayer]
+            The players, in the order of `battle_tags`.
+
+        Raises
+        ------
+        errors.ProfileNotFound
+            One of the battle tags does not have a profile.
+        """
+        guild = hikari.Snowflake(guild)
+        season = await get_season(guild)
+        records = {
+            record.get("btag"): record
+            for record in await cls._db.fetch(statements.PLAYERS_BY_BTAGS, list(battle_tags), guild, season)
+        }
+
+        for battle_tag in battle_tags:
+            if battle_tag not in records:
+                raise errors.ProfileNotFound(f"Нет профиля {battle_tag}")
+
+        return await cls._from_records(
+            [records[battle_tag] for battle_tag in battle_tags], [None] * len(battle_tags), guild, season
         )
 
+    @classmethod
+    async def _from_records(
+        cls,
+        records: t.Sequence[asyncpg.Record],
+        members: t.Sequence[t.Optional[hikari.Member | int]],
+        guild: hikari.Snowflake,
+        season: str,
+    ) -> t.List["HotsPlayer"]:
+        """Build players from records of `PLAYERS_BY_IDS`/`PLAYERS_BY_BTAGS`, loading achievements in one query."""
+        with_stats = list({record.get("id") for record in records if record.get("stats_season") is not None})
+        achievements: t.Dict[int, list] = {}
+        if with_stats:
+            for achievement in await cls._db.fetch(statements.PLAYERS_ACHIEVEMENTS, with_stats, guild, season):
+                achievements.setdefault(achievement.get("id"), []).append(achievement)
+
+        return [
+            cls(
+                member=member,
+                id=hikari.Snowflake(record.get("id")),
+                guild_id=hikari.Snowflake(record.get("guild_id")),
+                mention=f"<@{record.get('id')}>",
+                battle_tag=record.get("btag"),
+                mmr=record.get("mmr"),
+                league=leagues.get(record.get("league")),
+                division=record.get("division"),
+                stats=PlayerStats.from_player_record(record, guild, season, achievements.get(record.get("id"))),
+                blocked=record.get("blocked"),
+            )
+            for record, member in zip(records, members)
+        ]
+
 
 @attr.define()
 class HotsEvent(DatabaseModel):
@@ -911,7 +1034,7 @@ class HotsEvent(DatabaseModel):
     season: str
     map: str = "??"
 
-    async def update(self):
+    async def update(self, con: t.Optional[asyncpg.Connection] = None):
         await self._db.execute(
             """
             INSERT INTO event_history (event_id, guild_id, room_id, winner, active)
@@ -923,6 +1046,7 @@ class HotsEvent(DatabaseModel):
             self.room_id,
             self.winner,
             self.active,
+            con=con,
         )
 
     @classmethod
@@ -939,18 +1063,117 @@ class HotsEvent(DatabaseModel):
     ):
         if await _has_active_event(ctx):
             raise errors.HasActiveEvent
-        season = await cls._db.fetchval(
-            """
-            SELECT season FROM global_config where guild_id = $1
-            """,
-            hikari.Snowflake(ctx.guild_id),
-        )
-        event_id = None
+        season = await get_season(ctx.guild_id)
         blue = red = []
         if type == EventTypes.event5x5:
             blue, red = await matchmaking_5x5(ctx, type, players_str=players)
         elif type in [EventTypes.unranked, EventTypes.manual5x5, EventTypes.tournament]:
             blue, red = await matchmaking_5x5(ctx, type, players_str=players, manual=True)
+        return await cls.create(
+            time,
+            guild_id=ctx.guild_id,
+            admin=ctx.author,
+            room_id=ctx.channel_id,
+            type=type,
+            win_p=win_p,
+            lose_p=lose_p,
+            delta_mmr=delta_mmr,
+            map=map,
+            blue=blue,
+            red=red,
+            season=season,
+        )
+
+    @classmethod
+    async def init_lobbies(
+        cls,
+        time: datetime,
+        ctx: SamuroSlashContext,
+        rooms: t.Sequence[int],
+        win_p: int,
+        lose_p: int,
+        delta_mmr: int,
+        map: str,
+        players: str,
+    ) -> t.List["HotsEvent"]:
+        """Создать рейтинговые ивенты 5x5 сразу во всех комнатах из пула игроков, по одному лобби в комнате
+
+        Parameters
+        ----------
+        time : datetime
+            Время создания ивентов.
+        ctx : SamuroSlashContext
+            Контекст команды.
+        rooms : Sequence[int]
+            Комнаты для лобби, лобби создается не больше, чем комнат.
+        win_p : int
+            Баллы за победу.
+        lose_p : int
+            Баллы за поражение.
+        delta_mmr : int
+            Изменение ммр за матч.
+        map : str
+            Карта.
+        players : str
+            Упоминания игроков пула.
+
+        Returns
+        -------
+        List[HotsEvent]
+            Созданные ивенты, от сильнейшего лобби к слабейшему.
+
+        Raises
+        ------
+        errors.DuplicateRooms
+            Одна из комнат указана несколько раз.
+        errors.HasActiveEvent
+            В одной из комнат уже есть активный ивент.
+        errors.BadPlayersCount
+            Игроков в пуле меньше, чем на одно лобби.
+        """
+        if len(set(rooms)) != len(rooms):
+            raise errors.DuplicateRooms
+        if await cls._db.fetchval(statements.ROOMS_ACTIVE_EVENT, ctx.guild_id, list(rooms)):
+            raise errors.HasActiveEvent
+        season = await get_season(ctx.guild_id)
+        lobbies = await matchmaking_lobbies(ctx, players_str=players, max_lobbies=len(rooms))
+
+        return [
+            await cls.create(
+                time,
+                guild_id=ctx.guild_id,
+                admin=ctx.author,
+                room_id=room_id,
+                type=EventTypes.event5x5,
+                win_p=win_p,
+                lose_p=lose_p,
+                delta_mmr=delta_mmr,
+                map=map,
+                blue=blue,
+                red=red,
+                season=season,
+            )
+            for room_id, (blue, red) in zip(rooms, lobbies)
+        ]
+
+    @classmethod
+    async def create(
+        cls,
+        time: datetime,
+        guild_id: hikari.Snowflake,
+        admin: hikari.User,
+        room_id: int,
+        type: str,
+        win_p: int,
+        lose_p: int,
+        delta_mmr: int,
+        map: str,
+        blue: t.List[HotsPlayer],
+        red: t.List[HotsPlayer],
+        season: str,
+    ) -> "HotsEvent":
+        """Записать новый активный ивент с готовыми командами"""
+        event_id = None
         if len(blue) > 0 and len(red) > 0:
             event_id = await cls._db.fetchval(
                 """
@@ -966,7 +1189,7 @@ class HotsEvent(DatabaseModel):
                 RETURNING event_id
                 """,
                 time,
-                ctx.guild_id,
+                guild_id,
                 None,
                 True,
                 blue[0].battle_tag,
@@ -979,10 +1202,10 @@ class HotsEvent(DatabaseModel):
                 red[2].battle_tag,
                 red[3].battle_tag,
                 red[4].battle_tag,
-                ctx.channel_id,
+                room_id,
                 delta_mmr,
                 lose_p,
-                ctx.author.username,
+                admin.username,
                 type,
                 win_p,
                 season,
@@ -993,10 +1216,10 @@ class HotsEvent(DatabaseModel):
             id=event_id,
             time=time,
             ftime=datetime.strftime(time, f_time),
-            guild_id=ctx.guild_id,
-            room_id=ctx.channel_id,
+            guild_id=guild_id,
+            room_id=room_id,
             winner=None,
-            admin=ctx.author.id,
+            admin=admin.id,
             type=type,
             active=True,
             win_points=win_p,
@@ -1034,8 +1257,8 @@ class HotsEvent(DatabaseModel):
         ]
         red_btags = [record.get("red1"), record.get("red2"), record.get("red3"), record.get("red4"), record.get("red5")]
 
-        blue = [await HotsPlayer.btag_fetch(x, ctx.guild_id) for x in blue_btags]
-        red = [await HotsPlayer.btag_fetch(x, ctx.guild_id) for x in red_btags]
+        players = await HotsPlayer.btag_fetch_many(blue_btags + red_btags, ctx.guild_id)
+        blue, red = players[:5], players[5:]
 
         return cls(
             time=record.get("time"),
@@ -1078,71 +1301,68 @@ class HotsEvent(DatabaseModel):
         embed.add_field(name="Red", value="\n".join([x.mention for x in self.red]), inline=True)
         return embed
 
-    async def vote_log(self, winner):
+    async def vote_log(self, winner, con: t.Optional[asyncpg.Connection] = None):
         # TODO: Дописать голосования
-        records = await self._db.fetch(
-            """
-            SELECT * FROM votes 
-            WHERE event_id = $1""",
-            self.id,
-        )
-        for record in records:
-            flag = False
-            if record.get("vote") == winner:
-                flag = True
-            await self._db.execute(
-                """
-                INSERT INTO vote_log (id, event_id, won)
-                VALUES ($1, $2, $3)
-                ON CONFLICT (id, event_id) DO UPDATE 
-                SET won = $3
-                """,
-                record.get("id"),
-                record.get("event_id"),
-                flag,
-            )
+        await self._db.execute(statements.VOTE_LOG_SETTLE, self.id, winner, con=con)
 
     async def ending(self, ctx: SamuroSlashContext, winner: EventWinner) -> hikari.Embed:
         self.winner = winner
 
         winner_team = self.blue if self.winner == EventWinner.BLUE else self.red
         loser_team = self.blue if self.winner == EventWinner.RED else self.red
+        players: t.List[HotsPlayer] = []
+        logs: t.List[t.Tuple[t.Any, ...]] = []
         if self.type in [EventTypes.event5x5, EventTypes.manual5x5]:
-            for player in winner_team:
-                await player.ending_5x5(
-                    event_id=self.id, mmr=self.delta_mmr, points=self.win_points, winner=True, map=self.map
-                )
-            for player in loser_team:
-                await player.ending_5x5(
-                    event_id=self.id, mmr=self.delta_mmr, points=self.lose_points, winner=False, map=self.map
-                )
+            for team, is_winner, points in (
+                (winner_team, True, self.win_points),
+                (loser_team, False, self.lose_points),
+            ):
+                for player in team:
+                    mmr = player.end_5x5(mmr=self.delta_mmr, points=points, winner=is_winner)
+                    players.append(player)
+                    logs.append(
+                        player.log_row(event_id=self.id, winner=is_winner, mmr=mmr, points=points, map=self.map)
+                    )
         elif self.type == EventTypes.unranked or self.type == EventTypes.tournament:
             self.delta_mmr = 0
-            for player in winner_team:
-                await player.ending_unranked(
-                    event_id=self.id,
-                    mmr=self.delta_mmr,
-                    points=self.win_points,
-                    winner=True,
-                    map=self.map,
-                    type=self.type,
-                )
-            for player in loser_team:
-                await player.ending_unranked(
-                    event_id=self.id,
-                    mmr=self.delta_mmr,
-                    points=self.win_points,
-                    winner=False,
-                    map=self.map,
-                    type=self.type,
-                )
+            for team, is_winner in ((winner_team, True), (loser_team, False)):
+                for player in team:
+                    player.stats.add_result(winner=is_winner, points=self.win_points)
+                    logs.append(
+                        player.log_row(
+                            event_id=self.id,
+                            winner=is_winner,
+                            mmr=self.delta_mmr,
+                            points=self.win_points,
+                            map=self.map,
+                            type=self.type,
+                        )
+                    )
         else:
             pass  # другие типы ивентов
 
         self.active = False
-        await self.update()
+        # Весь матч записывается одной транзакцией, пачками запросов вместо запроса на каждого игрока
+        async with self._db.transaction() as con:
+            if logs:
+                await self._db.executemany(
+                    statements.PLAYER_STATS_UPSERT, [p.stats.as_row() for p in winner_team + loser_team], con=con
+                )
+            if players:
+                await self._db.executemany(statements.PLAYER_UPSERT, [p.as_row() for p in players], con=con)
+            if logs:
+                await self._db.executemany(statements.EVENT_LOG_UPSERT, logs, con=con)
+            await self.update(con=con)
+
+            await self.vote_log(winner=winner, con=con)
 
-        await self.vote_log(winner=winner)
+            rankings = []
+            if logs:
+                # ММР и лига игроков есть в рейтингах всех их сезонов, а не только текущего
+                ids = [p.id for p in winner_team + loser_team]
+                rankings = await self._db.fetch(statements.REFRESH_PLAYERS_RANKINGS, ids, con=con)
+
+        await self._rankings.update_records(rankings)
 
         return await self.ending_description(winner=winner)
 
@@ -1157,41 +1377,16 @@ class HotsEvent(DatabaseModel):
         return embed
 
     async def add_log(self):
-        for player in self.blue:
-            is_winner = self.winner == EventWinner.BLUE
-            points = self.win_points if is_winner else self.lose_points
-            await self._db.execute(
-                """INSERT INTO event_log (id, guild_id, event_id, winner, points, delta_mmr, map, season) 
-                VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-                ON CONFLICT DO NOTHING 
-                """,
-                player.id,
-                self.guild_id,
-                self.id,
-                is_winner,
-                points,
-                self.delta_mmr,
-                self.map,
-                self.season,
-            )
-
-        for player in self.red:
-            is_winner = self.winner == EventWinner.RED
+        """Дозаписать в лог матча недостающих игроков, уже записанные не меняются"""
+        rows = []
+        for team, winner in ((self.blue, EventWinner.BLUE), (self.red, EventWinner.RED)):
+            is_winner = self.winner == winner
             points = self.win_points if is_winner else self.lose_points
-            await self._db.execute(
-                """INSERT INTO event_log (id, guild_id, event_id, winner, points, delta_mmr, map, season) 
-                VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-                ON CONFLICT DO NOTHING 
-                """,
-                player.id,
-                self.guild_id,
-                self.id,
-                is_winner,
-                points,
-                self.delta_mmr,
-                self.map,
-                self.season,
-            )
+            for player in team:
+                rows.append(
+                    (player.id, self.guild_id, self.id, is_winner, points, self.delta_mmr, self.map, self.season)
+                )
+        await self._db.executemany(statements.EVENT_LOG_INSERT_MISSING, rows)
         logger.info(f"Событие #{self.id} добавлено")
 
     @classmethod
@@ -1212,8 +1407,8 @@ class HotsEvent(DatabaseModel):
         ]
         red_btags = [record.get("red1"), record.get("red2"), record.get("red3"), record.get("red4"), record.get("red5")]
 
-        blue = [await HotsPlayer.btag_fetch(x, guild_id) for x in blue_btags]
-        red = [await HotsPlayer.btag_fetch(x, guild_id) for x in red_btags]
+        players = await HotsPlayer.btag_fetch_many(blue_btags + red_btags, guild_id)
+        blue, red = players[:5], players[5:]
 
         return cls(
             time=record.get("time"),
@@ -1235,48 +1430,23 @@ class HotsEvent(DatabaseModel):
         )
 
     @classmethod
-    async def fetch_all(cls, guild_id: int):
-        records = await cls._db.fetch(
-            """SELECT * FROM event_history WHERE guild_id = $1
-            ORDER BY event_id DESC""",
-            guild_id,
-        )
-        if not records:
-            return []
+    async def list_source(cls, guild: hikari.SnowflakeishOr[hikari.PartialGuild]) -> t.Optional["GuildEventsSource"]:
+        """Get the matches of a guild as a page source, that loads one page at a time.
 
-        return [
-            cls(
-                time=record.get("time"),
-                ftime=datetime.strftime(record.get("time"), f_time),
-                guild_id=record.get("guild_id"),
-                room_id=record.get("room_id"),
-                id=record.get("event_id"),
-                winner=record.get("winner"),
-                admin=record.get("admin"),
-                type=record.get("type"),
-                active=record.get("active"),
-                lose_points=record.get("lose_points"),
-                win_points=record.get("win_points"),
-                delta_mmr=record.get("delta_mmr"),
-                blue=[
-                    record.get("blue1"),
-                    record.get("blue2"),
-                    record.get("blue3"),
-                    record.get("blue4"),
-                    record.get("blue5"),
-                ],
-                red=[
-                    record.get("red1"),
-                    record.get("red2"),
-                    record.get("red3"),
-                    record.get("red4"),
-                    record.get("red5"),
-                ],
-                season=record.get("season"),
-                map=record.get("map"),
-            )
-            for record in records
-        ]
+        Parameters
+        ----------
+        guild : hikari.SnowflakeishOr[hikari.PartialGuild]
+            The guild to get the matches of.
+
+        Returns
+        -------
+        Optional[GuildEventsSource]
+            The matches of the guild, or None if there are no matches.
+        """
+        source = GuildEventsSource(hikari.Snowflake(guild))
+        if not await source.get_row_count():
+            return None
+        return source
 
     def fetch_embed(self) -> hikari.Embed:
         map_img = util.maps_url + self.map.replace(" ", "-").lower() + "/main.jpg"
@@ -1300,3 +1470,73 @@ class HotsEvent(DatabaseModel):
         embed.add_field(name="Blue", value="\n".join([x.mention for x in self.blue]), inline=True)
         embed.add_field(name="Red", value="\n".join([x.mention for x in self.red]), inline=True)
         return embed
+
+
+class PlayerLogSource(KeysetPageSource, DatabaseModel):
+    """The match history of a player, newest matches first."""
+
+    key = "event_id"
+
+    def __init__(self, player: HotsPlayer, *, per_page: int = 10) -> None:
+        super().__init__(per_page=per_page)
+        self.player = player
+
+    async def count(self) -> int:
+        return await self._db.fetchval(statements.PLAYER_LOG_COUNT, self.player.id)
+
+    async def fetch_desc(self, below: t.Optional[int], offset: int, limit: int) -> t.List[asyncpg.Record]:
+        below = MAX_EVENT_ID if below is None else below
+        return await self._db.fetch(statements.PLAYER_LOG_PAGE_DESC, self.player.id, below, offset, limit)
+
+    async def fetch_asc(self, above: t.Optional[int], limit: int) -> t.List[asyncpg.Record]:
+        above = -1 if above is None else above
+        return await self._db.fetch(statements.PLAYER_LOG_PAGE_ASC, self.player.id, above, limit)
+
+    def format_page(self, rows: t.Sequence[asyncpg.Record], index: int) -> hikari.Embed:
+        lines = []
+        for record in rows:
+            mmr = str(record.get("delta_mmr"))
+            if mmr != "0":
+                mmr = "+" + mmr if record.get("winner") else "-" + mmr
+            result = const.EMOJI_GREEN_UP if record.get("winner") else const.EMOJI_RED_DOWN
+            lines.append(f"{result} ID: {record.get('event_id')} {record.get('map')} ({mmr})")
+
+        return hikari.Embed(
+            title=f"Матчи {self.player.battle_tag}\nРезультат, ID, Карта, ММР",
+            description="\n".join(lines),
+            color=const.EMBED_BLUE,
+        ).set_thumbnail(self.player.member.avatar_url)
+
+
+class GuildEventsSource(KeysetPageSource, DatabaseModel):
+    """The matches of a guild, newest matches first."""
+
+    key = "event_id"
+
+    def __init__(self, guild_id: hikari.Snowflake, *, per_page: int = 10) -> None:
+        super().__init__(per_page=per_page)
+        self.guild_id = guild_id
+
+    async def count(self) -> int:
+        return await self._db.fetchval(statements.GUILD_EVENTS_COUNT, self.guild_id)
+
+    async def fetch_desc(self, below: t.Optional[int], offset: int, limit: int) -> t.List[asyncpg.Record]:
+        below = MAX_EVENT_ID if below is None else below
+        return await self._db.fetch(statements.GUILD_EVENTS_PAGE_DESC, self.guild_id, below, offset, limit)
+
+    async def fetch_asc(self, above: t.Optional[int], limit: int) -> t.List[asyncpg.Record]:
+        above = -1 if above is None else above
+        return await self._db.fetch(statements.GUILD_EVENTS_PAGE_ASC, self.guild_id, above, limit)
+
+    def format_page(self, rows: t.Sequence[asyncpg.Record], index: int) -> hikari.Embed:
+        lines = []
+        for record in rows:
+            emoji = util.get_emoji_winner(record.get("winner"))
+            time = datetime.strftime(record.get("time"), f_time)
+            lines.append(f"{emoji} ID: {record.get('event_id')} - {time} - {record.get('map')}")
+
+        return hikari.Embed(
+            title="Список всех матчей сервера\nПобедитель, ID, Время, Карта",
+            description="\n".join(lines),
+            color=const.EMBED_BLUE,
+        )
@@ -0,0 +1,286 @@
+"""
+Registry of the hot queries of the bot. Every statement registered here is prepared once
+on each pooled database connection, and is run by passing it to the methods of Database
+in place of a query string.
+"""
+
+from __future__ import annotations
+
+import typing as t
+
+import attr
+
+
+@attr.frozen()
+class Statement:
+    """A named query, prepared ahead of time on every pooled connection."""
+
+    name: str
+    """The unique name of this statement."""
+
+    query: str
+    """The SQL of this statement."""
+
+
+STATEMENTS: t.Dict[str, Statement] = {}
+"""All registered statements, by name."""
+
+
+def register(name: str, query: str) -> Statement:
+    """Add a statement to the registry.
+
+    Parameters
+    ----------
+    name : str
+        The unique name of the statement.
+    query : str
+        The SQL of the statement.
+
+    Returns
+    -------
+    Statement
+        The registered statement.
+
+    Raises
+    ------
+    ValueError
+        A statement with this name is already registered.
+    """
+    if name in STATEMENTS:
+        raise ValueError(f"Statement '{name}' is already registered.")
+
+    STATEMENTS[name] = statement = Statement(name, query)
+    return statement
+
+
+GUILD_SEASON = register(
+    "guild_season",
+    """SELECT season FROM global_config WHERE guild_id = $1""",
+)
+
+PLAYER_BY_ID = register(
+    "player_by_id",
+    """SELECT * FROM players WHERE id = $1""",
+)
+
+PLAYERS_BY_IDS = register(
+    "players_by_ids",
+    """
+    SELECT p.*, s.btag AS stats_btag, s.points, s.win, s.lose, s.winstreak, s.max_ws, s.season AS stats_season
+    FROM players AS p
+    LEFT JOIN players_stats AS s ON s.id = p.id AND s.guild_id = $2 AND s.season = $3
+    WHERE p.id = ANY($1::bigint[])""",
+)
+
+PLAYERS_BY_BTAGS = register(
+    "players_by_btags",
+    """
+    SELECT p.*, s.btag AS stats_btag, s.points, s.win, s.lose, s.winstreak, s.max_ws, s.season AS stats_season
+    FROM players AS p
+    LEFT JOIN players_stats AS s ON s.id = p.id AND s.guild_id = $2 AND s.season = $3
+    WHERE p.btag = ANY($1::varchar[])""",
+)
+
+PLAYER_UPSERT = register(
+    "player_upsert",
+    """
+    INSERT INTO players (id, guild_id, btag, mmr, league, division, blocked)
+    VALUES ($1, $2, $3, $4, $5, $6, $7)
+    ON CONFLICT (id) DO
+    UPDATE SET guild_id = $2, btag = $3, mmr = $4, league = $5, division = $6, blocked = $7""",
+)
+
+PLAYER_STATS = register(
+    "player_stats",
+    """SELECT * FROM players_stats WHERE id = $1 AND guild_id = $2 AND season = $3""",
+)
+
+PLAYER_STATS_UPSERT = register(
+    "player_stats_upsert",
+    """
+    INSERT INTO players_stats (id, guild_id, btag, season, points, win, lose, winstreak, max_ws)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+    ON CONFLICT (id, guild_id, season) DO
+    UPDATE SET points = $5, win = $6, lose = $7, winstreak = $8, max_ws = $9""",
+)
+
+PLAYER_ACHIEVEMENTS = register(
+    "player_achievements",
+    """
+    SELECT ua.id, a.name, ua.timestamp FROM user_achievements as ua
+            INNER JOIN achievements as a
+            ON ua.achievement = a.id
+            WHERE ua.id = $1 AND ua.guild_id = $2 AND ( season = $3 OR season = 'ALL' )""",
+)
+
+PLAYERS_ACHIEVEMENTS = register(
+    "players_achievements",
+    """
+    SELECT ua.id, a.name, ua.timestamp FROM user_achievements as ua
+            INNER JOIN achievements as a
+            ON ua.achievement = a.id
+            WHERE ua.id = ANY($1::bigint[]) AND ua.guild_id = $2 AND ( season = $3 OR season = 'ALL' )""",
+)
+
+EVENT_LOG_UPSERT = register(
+    "event_log_upsert",
+    """
+    INSERT INTO event_log (id, guild_id, event_id, winner, points, delta_mmr, map, season, type)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+    ON CONFLICT (id, guild_id, event_id, season) DO UPDATE
+    SET winner = $4, points = $5, delta_mmr = $6, season = $8, type = $9""",
+)
+
+EVENT_LOG_INSERT_MISSING = register(
+    "event_log_insert_missing",
+    """
+    INSERT INTO event_log (id, guild_id, event_id, winner, points, delta_mmr, map, season)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+    ON CONFLICT DO NOTHING""",
+)
+
+SEASON_RANKINGS = register(
+    "season_rankings",
+    """SELECT * FROM player_rankings WHERE guild_id = $1 AND season = $2""",
+)
+
+REFRESH_RANKINGS = register(
+    "refresh_rankings",
+    """SELECT * FROM refresh_player_rankings($1, $2, $3::bigint[])""",
+)
+
+REFRESH_PLAYERS_RANKINGS = register(
+    "refresh_players_rankings",
+    """
+    SELECT r.* FROM (
+        SELECT guild_id, season, array_agg(id) AS ids FROM players_stats
+        WHERE id = ANY($1::bigint[]) GROUP BY guild_id, season ORDER BY guild_id, season
+    ) AS s, LATERAL refresh_player_rankings(s.guild_id, s.season, s.ids) AS r""",
+)
+
+
+HEAD_TO_HEAD = register(
+    "head_to_head",
+    """SELECT * FROM head_to_head WHERE guild_id = $1 AND player_a = $2 AND player_b = $3""",
+)
+
+PLAYER_VOTES = register(
+    "player_votes",
+    """
+    SELECT count(*) FILTER (WHERE won) AS correct, count(*) FILTER (WHERE won IS NOT TRUE) AS wrong
+    FROM vote_log WHERE id = $1""",
+)
+
+VOTE_LOG_SETTLE = register(
+    "vote_log_settle",
+    """
+    INSERT INTO vote_log (id, event_id, won)
+    SELECT id, event_id, coalesce(vote = $2, false) FROM votes WHERE event_id = $1
+    ON CONFLICT (id, event_id) DO UPDATE
+    SET won = excluded.won""",
+)
+
+PLAYER_LOG_COUNT = register(
+    "player_log_count",
+    """SELECT count(*) FROM event_log WHERE id = $1""",
+)
+
+PLAYER_LOG_PAGE_DESC = register(
+    "player_log_page_desc",
+    """
+    SELECT * FROM event_log WHERE id = $1 AND event_id < $2
+    ORDER BY event_id DESC OFFSET $3 LIMIT $4""",
+)
+
+PLAYER_LOG_PAGE_ASC = register(
+    "player_log_page_asc",
+    """
+    SELECT * FROM event_log WHERE id = $1 AND event_id > $2
+    ORDER BY event_id LIMIT $3""",
+)
+
+GUILD_EVENTS_COUNT = register(
+    "guild_events_count",
+    """SELECT count(*) FROM event_history WHERE guild_id = $1""",
+)
+
+GUILD_EVENTS_PAGE_DESC = register(
+    "guild_events_page_desc",
+    """
+    SELECT event_id, time, winner, map FROM event_history WHERE guild_id = $1 AND event_id < $2
+    ORDER BY event_id DESC OFFSET $3 LIMIT $4""",
+)
+
+GUILD_EVENTS_PAGE_ASC = register(
+    "guild_events_page_asc",
+    """
+    SELECT event_id, time, winner, map FROM event_history WHERE guild_id = $1 AND event_id > $2
+    ORDER BY event_id LIMIT $3""",
+)
+
+PLAYERS_FIX_LEAGUES = register(
+    "players_fix_leagues",
+    """
+    WITH thresholds AS (
+        SELECT league, division, mmr AS low, lead(mmr) OVER (ORDER BY mmr) AS high
+        FROM unnest($1::varchar[], $2::int[], $3::int[]) AS t(league, division, mmr)
+    )
+    UPDATE players AS p SET league = t.league::league_type, division = t.division
+    FROM thresholds AS t
+    WHERE p.mmr > t.low AND (t.high IS NULL OR p.mmr <= t.high)
+      AND (p.league IS DISTINCT FROM t.league::league_type OR p.division IS DISTINCT FROM t.division)
+    RETURNING p.id, p.guild_id, p.btag, p.league, p.mmr""",
+)
+
+ROOMS_ACTIVE_EVENT = register(
+    "rooms_active_event",
+    """SELECT EXISTS(SELECT 1 FROM event_history WHERE guild_id = $1 AND room_id = ANY($2::bigint[]) AND active)""",
+)
+
+LOBBY_TEAMMATES = register(
+    "lobby_teammates",
+    """
+    SELECT player_a, player_b, together_wins + together_losses AS together FROM head_to_head
+    WHERE guild_id = $1 AND player_a = ANY($2::bigint[]) AND player_b = ANY($2::bigint[])""",
+)
+
+QUEUES = register(
+    "queues",
+    """SELECT * FROM matchmaking_queues""",
+)
+
+QUEUES_PLAYERS = register(
+    "queues_players",
+    """SELECT * FROM matchmaking_queue_players ORDER BY guild_id, room_id, position""",
+)
+
+QUEUE_UPSERT = register(
+    "queue_upsert",
+    """
+    INSERT INTO matchmaking_queues (guild_id, room_id, win_points, lose_points, delta_mmr)
+    VALUES ($1, $2, $3, $4, $5)
+    ON CONFLICT (guild_id, room_id) DO UPDATE
+    SET win_points = $3, lose_points = $4, delta_mmr = $5""",
+)
+
+QUEUE_SET_MESSAGE = register(
+    "queue_set_message",
+    """UPDATE matchmaking_queues SET message_id = $3 WHERE guild_id = $1 AND room_id = $2""",
+)
+
+QUEUE_DELETE = register(
+    "queue_delete",
+    """DELETE FROM matchmaking_queues WHERE guild_id = $1 AND room_id = $2""",
+)
+
+QUEUE_PLAYERS_CLEAR = register(
+    "queue_players_clear",
+    """DELETE FROM matchmaking_queue_players WHERE guild_id = $1 AND room_id = $2""",
+)
+
+QUEUE_PLAYER_INSERT = register(
+    "queue_player_insert",
+    """INSERT INTO matchmaking_queue_players (guild_id, room_id, position, id) VALUES ($1, $2, $3, $4)""",
+)
+
+# by fenrir#5455
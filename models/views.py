@@ -1,4 +1,14 @@
-from typing import List, Optional, Union
+import abc
+import math
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+from typing import overload
 
 import hikari
 import lightbulb
@@ -40,11 +50,122 @@ class AuthorOnlyView(miru.View):
         return ctx.user.id == self.lctx.author.id
 
 
+class PageSource(abc.ABC):
+    """
+    A source of navigator pages, that are built one at a time when they are first shown.
+    """
+
+    @abc.abstractmethod
+    async def get_page_count(self) -> int:
+        """Get the total amount of pages."""
+
+    @abc.abstractmethod
+    async def get_page(self, index: int) -> Union[str, hikari.Embed]:
+        """Build the page at the given zero-based index."""
+
+
+class KeysetPageSource(PageSource, abc.ABC):
+    """
+    A page source over rows ordered by a unique key in descending order, such as the newest matches first.
+
+    Pages are fetched with keyset pagination: the first and last key of every loaded page are remembered,
+    so the previous, next, first and last pages are fetched from an index without reading the rows before
+    them. Only jumping to an arbitrary page far from any loaded one falls back to an offset.
+    """
+
+    key: str
+    """The column rows are ordered and paginated by."""
+
+    def __init__(self, *, per_page: int = 10) -> None:
+        self.per_page = per_page
+        self._count: Optional[int] = None
+        self._bounds: Dict[int, Tuple[Any, Any]] = {}
+
+    @abc.abstractmethod
+    async def count(self) -> int:
+        """Count all rows of the source."""
+
+    @abc.abstractmethod
+    async def fetch_desc(self, below: Optional[Any], offset: int, limit: int) -> Sequence[Mapping[str, Any]]:
+        """Fetch rows with a key smaller than `below` if it is given, in descending order of the key."""
+
+    @abc.abstractmethod
+    async def fetch_asc(self, above: Optional[Any], limit: int) -> Sequence[Mapping[str, Any]]:
+        """Fetch rows with a key greater than `above` if it is given, in ascending order of the key."""
+
+    @abc.abstractmethod
+    def format_page(self, rows: Sequence[Mapping[str, Any]], index: int) -> Union[str, hikari.Embed]:
+        """Build a page from its rows."""
+
+    async def get_row_count(self) -> int:
+        """Get the total amount of rows, counting them once."""
+        if self._count is None:
+            self._count = await self.count()
+        return self._count
+
+    async def get_page_count(self) -> int:
+        return math.ceil(await self.get_row_count() / self.per_page)
+
+    async def get_page(self, index: int) -> Union[str, hikari.Embed]:
+        last = await self.get_page_count() - 1
+
+        if index == 0:
+            rows = await self.fetch_desc(None, 0, self.per_page)
+        elif index - 1 in self._bounds:
+            rows = await self.fetch_desc(self._bounds[index - 1][1], 0, self.per_page)
+        elif index + 1 in self._bounds:
+            rows = list(reversed(await self.fetch_asc(self._bounds[index + 1][0], self.per_page)))
+        elif index == last:
+            rows = list(reversed(await self.fetch_asc(None, await self.get_row_count() - index * self.per_page)))
+        else:
+            rows = await self.fetch_desc(None, index * self.per_page, self.per_page)
+
+        if rows:
+            self._bounds[index] = (rows[0][self.key], rows[-1][self.key])
+        return self.format_page(rows, index)
+
+
+class LazyPages(Sequence[Union[str, hikari.Embed]]):
+    """
+    The pages of a navigator backed by a PageSource. Pages must be loaded before they are accessed,
+    and are kept once loaded.
+    """
+
+    def __init__(self, source: PageSource) -> None:
+        self.source = source
+        self._count: int = 0
+        self._pages: Dict[int, Union[str, hikari.Embed]] = {}
+
+    async def load(self, index: int) -> None:
+        """Load the page count and the page at the given index, if they are not loaded yet."""
+        if not self._count:
+            self._count = await self.source.get_page_count()
+        if index not in self._pages:
+            self._pages[index] = await self.source.get_page(index)
+
+    def __len__(self) -> int:
+        return self._count
+
+    @overload
+    def __getitem__(self, index: int) -> Union[str, hikari.Embed]:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> Sequence[Union[str, hikari.Embed]]:
+        ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        return self._pages[index % self._count if index < 0 else index]
+
+
 class SamuroNavigator(nav.NavigatorView):
     def __init__(
         self,
         *,
-        pages: List[Union[str, hikari.Embed]],
+        pages: Optional[List[Union[str, hikari.Embed]]] = None,
+        source: Optional[PageSource] = None,
         buttons: Optional[List[nav.NavButton]] = None,
         timeout: Optional[float] = 120,
         autodefer: bool = True,
@@ -56,8 +177,25 @@ class SamuroNavigator(nav.NavigatorView):
             nav.NextButton(emoji=const.EMOJI_NEXT),
             nav.LastButton(emoji=const.EMOJI_LAST),
         ]
+        if (pages is None) == (source is None):
+            raise TypeError("Exactly one of pages or source must be provided.")
+
+        self._lazy_pages = LazyPages(source) if source is not None else None
+        pages = self._lazy_pages if self._lazy_pages is not None else pages
         super().__init__(pages=pages, buttons=buttons, timeout=timeout, autodefer=autodefer)
 
+    async def send_page(self, context: miru.Context, page_index: Optional[int] = None) -> None:
+        if page_index is not None:
+            self.current_page = page_index
+        if self._lazy_pages is not None:
+            await self._lazy_pages.load(self.current_page)
+        await super().send_page(context)
+
+    async def send(self, to: Any, *, start_at: int = 0, **kwargs: Any) -> None:
+        if self._lazy_pages is not None:
+            await self._lazy_pages.load(start_at)
+        await super().send(to, start_at=start_at, **kwargs)
+
 
 class AuthorOnlyNavigator(SamuroNavigator):
     """
@@ -68,14 +206,15 @@ class AuthorOnlyNavigator(SamuroNavigator):
         self,
         lctx: lightbulb.Context,
         *,
-        pages: List[Union[str, hikari.Embed]],
+        pages: Optional[List[Union[str, hikari.Embed]]] = None,
+        source: Optional[PageSource] = None,
         buttons: Optional[List[nav.NavButton]] = None,
         timeout: Optional[float] = 120,
         autodefer: bool = True,
     ) -> None:
         self.lctx = lctx
 
-        super().__init__(pages=pages, buttons=buttons, timeout=timeout, autodefer=autodefer)
+        super().__init__(pages=pages, source=source, buttons=buttons, timeout=timeout, autodefer=autodefer)
 
     async def view_check(self, ctx: miru.Context) -> bool:
         if ctx.user.id != self.lctx.author.id:
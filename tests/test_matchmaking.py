@@ -0,0 +1,230 @@
+"""
+Benchmark and regression suite of the team balancing code, runs offline on synthetic players.
+
+Every case reports runtime percentiles and the achieved mmr difference between the teams
+compared to the optimum, so that changes to the balancing code can be compared over time.
+Only the balance is asserted, timings depend on the machine and are reported without a limit.
+The grouping of players into lobbies is a heuristic, its gap to the true optimum is checked at 20 players,
+where every grouping can still be tried, against the gaps recorded when the suite was written:
+
+    python -m pytest tests/test_matchmaking.py
+"""
+
+import itertools
+import math
+import random
+import time
+import typing as t
+
+import numpy as np
+import pytest
+
+from utils import hots as util
+
+SEED = 5455
+LOBBIES = 30  # Lobbies generated per case
+RUNS = 5  # Timed runs per lobby
+LOBBY_TIME_BUDGET = 0.05
+OPTIMUM_LOBBIES = 10  # Lobbies of 20 players compared to the optimal grouping per distribution
+# Summed gap of the optimum lobbies of each distribution, measured with the local search run to the end
+OPTIMUM_GAPS = {
+    "uniform": 36,
+    "bimodal": 192,
+    "leagues": 20,
+}
+
+
+def uniform(rng: random.Random) -> int:
+    return rng.randint(2000, 3200)
+
+
+def bimodal(rng: random.Random) -> int:
+    return round(rng.gauss(2350, 60) if rng.random() < 0.5 else rng.gauss(2900, 80))
+
+
+# Share of the players of each league, most of them are in the middle leagues
+LEAGUE_WEIGHTS = {
+    "Bronze": 10,
+    "Silver": 20,
+    "Gold": 30,
+    "Platinum": 20,
+    "Diamond": 12,
+    "Master": 6,
+    "Grandmaster": 2,
+}
+DIVISIONS = list(util.flatten_mmr.items())
+
+
+def leagues(rng: random.Random) -> int:
+    """An mmr within a random division, with divisions weighted by the size of their league."""
+    weights = [LEAGUE_WEIGHTS[name.split(".")[0]] for name, _ in DIVISIONS]
+    index = rng.choices(range(len(DIVISIONS)), weights=weights)[0]
+    low = max(DIVISIONS[index][1], 2000)
+    high = DIVISIONS[index + 1][1] if index + 1 < len(DIVISIONS) else 3300
+    return rng.randint(low + 1, max(high, low + 1))
+
+
+DISTRIBUTIONS: t.Dict[str, t.Callable[[random.Random], int]] = {
+    "uniform": uniform,
+    "bimodal": bimodal,
+    "leagues": leagues,
+}
+
+
+def generate(distribution: str, size: int) -> t.List[t.List[int]]:
+    rng = random.Random(f"{SEED}-{distribution}-{size}")
+    return [[DISTRIBUTIONS[distribution](rng) for _ in range(size)] for _ in range(LOBBIES)]
+
+
+def percentile(values: t.Sequence[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def timed(func: t.Callable[[], t.Any]) -> t.Tuple[t.Any, t.List[float]]:
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, timings
+
+
+def team_diff(values: t.Sequence[int], team_one: t.Sequence[int], team_two: t.Sequence[int]) -> int:
+    return abs(sum(values[i] for i in team_one) - sum(values[i] for i in team_two))
+
+
+def optimal_diff(values: t.Sequence[int]) -> int:
+    """The smallest possible difference of two equal teams, by trying every split."""
+    total = sum(values)
+    rest = values[1:]
+    return min(abs(total - 2 * (values[0] + sum(team))) for team in itertools.combinations(rest, len(values) // 2 - 1))
+
+
+def split_members(size: int) -> np.ndarray:
+    """Membership matrix of the first team of every split of `size` players, the first player is always in it."""
+    splits = [(0, *team) for team in itertools.combinations(range(1, size), size // 2 - 1)]
+    members = np.zeros((len(splits), size), dtype=np.float32)
+    for row, team in enumerate(splits):
+        members[row, list(team)] = 1
+    return members
+
+
+def best_split_diffs(values: np.ndarray, members: np.ndarray) -> np.ndarray:
+    """The smallest difference of two equal teams for each row of lobby values."""
+    diffs = values @ members.T
+    diffs *= 2
+    np.subtract(values.sum(axis=1)[:, None], diffs, out=diffs)
+    np.abs(diffs, out=diffs)
+    return diffs.min(axis=1)
+
+
+def optimal_grouping(values: t.Sequence[int]) -> int:
+    """
+    The smallest possible summed difference of two lobbies of 5v5, by trying every grouping and every split.
+
+    The first player is always in the first lobby, so each of the 92378 groupings is tried once.
+    """
+    size = len(values)
+    first = np.array([(0, *lobby) for lobby in itertools.combinations(range(1, size), size // 2 - 1)])
+    taken = np.zeros((len(first), size), dtype=bool)
+    np.put_along_axis(taken, first, True, axis=1)
+    second = np.nonzero(~taken)[1].reshape(len(first), size // 2)
+
+    members = split_members(size // 2)
+    array = np.array(values, dtype=np.float32)
+    return int((best_split_diffs(array[first], members) + best_split_diffs(array[second], members)).min())
+
+
+def report(name: str, timings: t.Sequence[float], gaps: t.Sequence[float]) -> None:
+    p50, p95, p99 = (percentile(timings, q) * 1000 for q in (50, 95, 99))
+    print(
+        f"\n{name:<32} p50 {p50:8.3f} ms  p95 {p95:8.3f} ms  p99 {p99:8.3f} ms  "
+        f"gap mean {sum(gaps) / len(gaps):7.2f}  gap max {max(gaps):5}"
+    )
+
+
+@pytest.mark.parametrize("distribution", DISTRIBUTIONS)
+@pytest.mark.parametrize("size", [10, 12, 16])
+def test_balanced_teams(distribution: str, size: int) -> None:
+    timings, gaps = [], []
+    for values in generate(distribution, size):
+        (team_one, team_two), runs = timed(lambda: util.balanced_teams(values))
+        timings.extend(runs)
+
+        assert sorted(team_one + team_two) == list(range(size))
+        assert len(team_one) == len(team_two)
+        gaps.append(team_diff(values, team_one, team_two) - optimal_diff(values))
+
+    report(f"balanced_teams {distribution} {size}", timings, gaps)
+    assert max(gaps) == 0
+
+
+@pytest.mark.parametrize("distribution", DISTRIBUTIONS)
+@pytest.mark.parametrize("size", [10, 20, 30, 40])
+def test_balanced_lobbies(distribution: str, size: int) -> None:
+    """Every lobby must be split optimally, the gap is how much the local search improved on the lobbies
+    the players are first grouped into."""
+    timings, gains = [], []
+    for values in generate(distribution, size):
+        lobbies, runs = timed(lambda: util.balanced_lobbies(values, time_budget=LOBBY_TIME_BUDGET))
+        timings.extend(runs)
+
+        assert sorted(i for team_one, team_two in lobbies for i in team_one + team_two) == list(range(size))
+        assert all(len(team_one) == len(team_two) == 5 for team_one, team_two in lobbies)
+        for team_one, team_two in lobbies:
+            assert team_diff(values, team_one, team_two) == optimal_diff([values[i] for i in team_one + team_two])
+
+        achieved = sum(team_diff(values, *lobby) for lobby in lobbies)
+        seed = util.balanced_lobbies(values, time_budget=0)
+        gains.append(sum(team_diff(values, *lobby) for lobby in seed) - achieved)
+
+    report(f"balanced_lobbies {distribution} {size}", timings, gains)
+
+
+@pytest.mark.parametrize("distribution", DISTRIBUTIONS)
+def test_balanced_lobbies_optimum(distribution: str) -> None:
+    """The time budget is large enough for the local search to always run to the end, so that the gaps do not
+    depend on the machine."""
+    timings, gaps = [], []
+    for values in generate(distribution, 20)[:OPTIMUM_LOBBIES]:
+        lobbies, runs = timed(lambda: util.balanced_lobbies(values, time_budget=1))
+        timings.extend(runs)
+        gaps.append(sum(team_diff(values, *lobby) for lobby in lobbies) - optimal_grouping(values))
+
+    report(f"balanced_lobbies optimum {distribution}", timings, gaps)
+    assert min(gaps) >= 0
+    assert sum(gaps) <= OPTIMUM_GAPS[distribution]
+
+
+@pytest.mark.parametrize("distribution", DISTRIBUTIONS)
+def test_pick_lobby(distribution: str) -> None:
+    """The first lobby of the queue order that can be split within the limit must be picked, the gap is
+    how much worse it is split than the best lobby that could have been picked."""
+    timings, gaps = [], []
+    for values in generate(distribution, 14):
+        teams, runs = timed(lambda: util.pick_lobby(values, max_diff=50))
+        timings.extend(runs)
+
+        lobby = list(range(10))
+        candidates = [lobby] + [
+            lobby[:replaced] + lobby[replaced + 1 :] + [waiting]
+            for waiting in range(10, len(values))
+            for replaced in range(1, 10)
+        ]
+        diffs = [optimal_diff([values[i] for i in candidate]) for candidate in candidates]
+        qualifying = [candidate for candidate, diff in zip(candidates, diffs) if diff <= 50]
+        if not qualifying:
+            assert teams is None
+            continue
+
+        assert teams is not None
+        team_one, team_two = teams
+        assert sorted(team_one + team_two) == sorted(qualifying[0])
+        assert team_diff(values, team_one, team_two) == optimal_diff([values[i] for i in qualifying[0]])
+        gaps.append(team_diff(values, team_one, team_two) - min(diffs))
+
+    report(f"pick_lobby {distribution} 14", timings, gaps or [0])
+
+
+# by fenrir#5455
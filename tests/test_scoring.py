@@ -0,0 +1,77 @@
+import itertools
+import math
+import random
+import typing as t
+
+import pytest
+
+from utils import scoring
+
+SEED = 5455
+
+
+def lobby(size: int) -> scoring.LobbyStats:
+    rng = random.Random(f"{SEED}-{size}")
+    teammates = [[0] * size for _ in range(size)]
+    for i in range(size):
+        for j in range(i + 1, size):
+            teammates[i][j] = teammates[j][i] = rng.randint(0, 6)
+
+    return scoring.LobbyStats(
+        mmr=[rng.randint(2000, 3200) for _ in range(size)],
+        leagues=[rng.randint(0, 6) for _ in range(size)],
+        winstreaks=[rng.randint(-5, 5) for _ in range(size)],
+        teammates=teammates,
+    )
+
+
+def reference_costs(stats: scoring.LobbyStats, weights: scoring.SplitWeights) -> t.Sequence[float]:
+    """The costs of `scoring._costs_numpy`, computed one split at a time."""
+    players = range(len(stats.mmr))
+    size = len(stats.mmr) // 2
+
+    def spread(team: t.Sequence[int]) -> float:
+        mean = sum(stats.mmr[i] for i in team) / size
+        return math.sqrt(max(sum(stats.mmr[i] ** 2 for i in team) / size - mean**2, 0.0))
+
+    def repeats(team: t.Sequence[int]) -> int:
+        return sum(stats.teammates[i][j] for i, j in itertools.combinations(team, 2))
+
+    costs = []
+    for one in scoring._splits(len(stats.mmr)):
+        two = [i for i in players if i not in one]
+        costs.append(
+            weights.mmr * abs(sum(stats.mmr[i] for i in one) - sum(stats.mmr[i] for i in two))
+            + weights.mmr_spread * abs(spread(one) - spread(two))
+            + weights.league * abs(sum(stats.leagues[i] for i in one) - sum(stats.leagues[i] for i in two))
+            + weights.repeat_teammates * (repeats(one) + repeats(two))
+            + weights.winstreak * abs(sum(stats.winstreaks[i] for i in one) - sum(stats.winstreaks[i] for i in two))
+        )
+    return costs
+
+
+@pytest.mark.parametrize("size", [2, 4, 10, 12])
+def test_costs_match_reference(size: int) -> None:
+    stats = lobby(size)
+    weights = scoring.SplitWeights(mmr=1.5, mmr_spread=0.5, league=7.0, repeat_teammates=3.0, winstreak=2.0)
+
+    assert scoring._costs_numpy(stats, weights).tolist() == pytest.approx(reference_costs(stats, weights))
+
+
+def test_score_splits() -> None:
+    stats = lobby(10)
+    costs = reference_costs(stats, scoring.SplitWeights())
+    splits = scoring.score_splits(stats, top=5)
+
+    assert [split.cost for split in splits] == pytest.approx(sorted(costs)[:5])
+    for split in splits:
+        assert 0 in split.team_one
+        assert sorted(split.team_one + split.team_two) == list(range(10))
+
+
+def test_score_splits_odd_lobby() -> None:
+    with pytest.raises(ValueError):
+        scoring.score_splits(lobby(9))
+
+
+# by fenrir#5455
@@ -1,40 +1,387 @@
 from __future__ import annotations
 
+import asyncio
+import itertools
+import json
 import logging
 import re
+import sys
+import time
 import typing as t
+from collections import OrderedDict
 
+import attr
 import hikari
 
-from models.db import DatabaseModel
-
 logger = logging.getLogger(__name__)
 
 if t.TYPE_CHECKING:
     from models import SamuroBot
 
+RowT = t.Dict[str, t.Any]
+FlightKeyT = t.Tuple[str, t.Tuple[str, ...], t.Tuple[t.Any, ...]]
+
+NEGATIVE_TTL: float = 300.0
+"""The amount of seconds a lookup that returned no rows is remembered for."""
+
+INVALIDATION_CHANNEL: str = "cache_invalidation"
+"""The notification channel the database announces changes to cached tables on, see migration 6."""
+
+PINNED_TABLES: t.FrozenSet[str] = frozenset({"global_config", "blacklist"})
+"""Tables that are hit on nearly every event, and are never evicted from the cache."""
+
+
+@attr.frozen()
+class TableStats:
+    """A snapshot of the cache usage of a single table."""
+
+    table: str
+    entries: int
+    bytes: int
+    hits: int
+    misses: int
+    evictions: int
+    pinned: bool
+
+    @property
+    def hit_rate(self) -> float:
+        """The ratio of lookups that were answered without querying the database."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class CachePartition:
+    """
+    The cached rows of a single guild within a table. Rows are keyed by identity, and hash
+    indexes are built lazily for every set of columns the partition is filtered by, then
+    kept up to date as rows are added and removed.
+
+    Lookups that are known to have no rows in the database are remembered separately,
+    until they expire, or a row that would match them is added.
+    """
+
+    def __init__(self) -> None:
+        self.rows: t.Dict[int, RowT] = {}
+        self.indexes: t.Dict[t.Tuple[str, ...], t.Dict[t.Tuple[t.Any, ...], t.Dict[int, RowT]]] = {}
+        self.misses: t.Dict[t.Tuple[str, ...], t.Dict[t.Tuple[t.Any, ...], float]] = {}
+        self.expires: t.Dict[int, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def bucket(self, columns: t.Tuple[str, ...], key: t.Tuple[t.Any, ...]) -> t.Optional[t.Dict[int, RowT]]:
+        """Get the rows where the columns match the key, building the index for the columns if needed."""
+        index = self.indexes.get(columns)
+        if index is None:
+            index = {}
+            for row_id, row in self.rows.items():
+                index.setdefault(tuple(row.get(column) for column in columns), {})[row_id] = row
+            self.indexes[columns] = index
+        return index.get(key)
+
+    def add(self, row: RowT, expires: t.Optional[float] = None) -> None:
+        """Add a row to the partition and all of it's indexes."""
+        row_id = id(row)
+        self.rows[row_id] = row
+        if expires is not None:
+            self.expires[row_id] = expires
+
+        for columns, index in self.indexes.items():
+            index.setdefault(tuple(row.get(column) for column in columns), {})[row_id] = row
+
+        self.forget_missing(row)
+
+    def remove(self, row: RowT) -> bool:
+        """Remove a row from the partition and all of it's indexes. Returns False if it was not present."""
+        row_id = id(row)
+        if self.rows.pop(row_id, None) is None:
+            return False
+
+        self.expires.pop(row_id, None)
+        for columns, index in self.indexes.items():
+            key = tuple(row.get(column) for column in columns)
+            bucket = index.get(key)
+            if bucket is None:
+                continue
+            bucket.pop(row_id, None)
+            if not bucket:
+                del index[key]
+        return True
+
+    def mark_missing(
+        self, columns: t.Tuple[str, ...], key: t.Tuple[t.Any, ...], expires: float, max_misses: t.Optional[int]
+    ) -> None:
+        """Remember that there are no rows in the database where the columns match the key."""
+        misses = self.misses.setdefault(columns, {})
+        misses.pop(key, None)
+        misses[key] = expires
+
+        # Misses are kept in insertion order, so the oldest ones are dropped first
+        if max_misses is not None:
+            while len(misses) > max_misses:
+                del misses[next(iter(misses))]
+
+    def is_missing(self, columns: t.Tuple[str, ...], key: t.Tuple[t.Any, ...]) -> bool:
+        """Check if a lookup is known to have no rows in the database."""
+        misses = self.misses.get(columns)
+        if not misses:
+            return False
+
+        expires = misses.get(key)
+        if expires is None:
+            return False
+
+        if expires <= time.monotonic():
+            del misses[key]
+            return False
+
+        return True
+
+    def forget_missing(self, row: RowT) -> None:
+        """Forget all remembered misses the row would be a result for."""
+        for columns, misses in self.misses.items():
+            misses.pop(tuple(row.get(column) for column in columns), None)
+
+    def forget_possible_misses(self, values: t.Mapping[str, t.Any]) -> None:
+        """Forget all remembered misses a row could be a result for, when only some of it's columns are known."""
+        for columns, misses in self.misses.items():
+            known = [(position, values[column]) for position, column in enumerate(columns) if column in values]
+            if not known:
+                misses.clear()
+                continue
+
+            for key in [key for key in misses if all(key[position] == value for position, value in known)]:
+                del misses[key]
+
+    def size(self) -> int:
+        """Approximate the amount of memory used by the cached rows, in bytes."""
+        return sum(
+            sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values()) for row in self.rows.values()
+        )
+
+
+class CachedTable:
+    """
+    The cached rows of a single table, partitioned by guild_id, so that dropping or
+    reloading every row of a guild is a single dict operation. Rows of tables that are
+    not bound to a guild, and misses of lookups that do not filter by guild_id, are kept
+    in the partition with a key of None.
+
+    If `max_rows` is set, the least recently used rows are evicted once the table grows
+    past it, and if `ttl` is set, rows older than it are discarded when next looked up.
+    """
+
+    def __init__(self, *, max_rows: t.Optional[int] = None, ttl: t.Optional[float] = None) -> None:
+        self.partitions: t.Dict[t.Optional[int], CachePartition] = {}
+        # Row identity -> partition key, in least recently used order
+        self.order: t.OrderedDict[int, t.Optional[int]] = OrderedDict()
+        self.count: int = 0
+        self.max_rows: t.Optional[int] = max_rows
+        self.ttl: t.Optional[float] = ttl
+        self.hits: int = 0
+        self.lookups: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _lookup(
+        self, kwargs: t.Dict[str, t.Any]
+    ) -> t.Tuple[t.Optional[int], t.Tuple[str, ...], t.Tuple[t.Any, ...], bool]:
+        """Split a lookup into it's partition key, the remaining columns and their values."""
+        scoped = "guild_id" in kwargs
+        partition_key = kwargs["guild_id"] if scoped else None
+        columns = tuple(sorted(column for column in kwargs if column != "guild_id"))
+        return partition_key, columns, tuple(kwargs[column] for column in columns), scoped
+
+    def find(self, limit: t.Optional[int] = None, **kwargs: t.Any) -> t.List[RowT]:
+        """Return all rows where the columns match the given values."""
+        partition_key, columns, key, scoped = self._lookup(kwargs)
+        if scoped:
+            partition = self.partitions.get(partition_key)
+            partitions = [partition] if partition is not None else []
+        else:
+            partitions = list(self.partitions.values())
+
+        rows: t.List[RowT] = []
+        for partition in partitions:
+            bucket = partition.bucket(columns, key)
+            if not bucket:
+                continue
+
+            if self.ttl is not None:
+                now = time.monotonic()
+                for row in [row for row_id, row in bucket.items() if partition.expires[row_id] <= now]:
+                    self.remove(row)
+
+            rows.extend(itertools.islice(bucket.values(), limit - len(rows) if limit else None))
+            if limit and len(rows) >= limit:
+                break
+
+        if self.max_rows is not None:
+            for row in rows:
+                self.order.move_to_end(id(row))
+        return rows
+
+    def add(self, row: RowT) -> None:
+        """Add a row to the table."""
+        partition_key = row.get("guild_id")
+        partition = self.partitions.get(partition_key)
+        if partition is None:
+            partition = self.partitions[partition_key] = CachePartition()
+
+        partition.add(row, time.monotonic() + self.ttl if self.ttl is not None else None)
+        self.count += 1
+
+        # The row may also satisfy lookups that do not filter by guild
+        if partition_key is not None and (unscoped := self.partitions.get(None)) is not None:
+            unscoped.forget_missing(row)
+
+        if self.max_rows is None:
+            return
+
+        self.order[id(row)] = partition_key
+        self.order.move_to_end(id(row))
+        while self.count > self.max_rows and self.order:
+            row_id, partition_key = self.order.popitem(last=False)
+            partition = self.partitions.get(partition_key)
+            # Entries of dropped partitions are left behind and skipped here
+            if partition is None or (lru_row := partition.rows.get(row_id)) is None:
+                continue
+            partition.remove(lru_row)
+            self.count -= 1
+            self.evictions += 1
+
+    def remove(self, row: RowT) -> None:
+        """Remove a row from the table."""
+        partition = self.partitions.get(row.get("guild_id"))
+        if partition is not None and partition.remove(row):
+            self.count -= 1
+            self.order.pop(id(row), None)
+
+    def remove_matching(self, **kwargs: t.Any) -> None:
+        """Remove all rows where the columns match the given values."""
+        for row in self.find(**kwargs):
+            self.remove(row)
+
+    def drop_partition(self, guild_id: int) -> None:
+        """Remove all rows and remembered misses of a guild."""
+        partition = self.partitions.pop(guild_id, None)
+        if partition is None:
+            return
+
+        self.count -= len(partition)
+        # Compact the LRU order once entries left behind by dropped partitions pile up
+        if len(self.order) > 2 * self.count + 1024:
+            self.order = OrderedDict(
+                (row_id, key)
+                for row_id, key in self.order.items()
+                if key in self.partitions and row_id in self.partitions[key].rows
+            )
+
+    def mark_missing(self, ttl: float, **kwargs: t.Any) -> None:
+        """Remember that there are no rows in the database where the columns match the given values."""
+        partition_key, columns, key, _ = self._lookup(kwargs)
+        partition = self.partitions.get(partition_key)
+        if partition is None:
+            partition = self.partitions[partition_key] = CachePartition()
+        partition.mark_missing(columns, key, time.monotonic() + ttl, self.max_rows)
+
+    def is_missing(self, **kwargs: t.Any) -> bool:
+        """Check if a lookup is known to have no rows in the database."""
+        partition_key, columns, key, _ = self._lookup(kwargs)
+        partition = self.partitions.get(partition_key)
+        return partition is not None and partition.is_missing(columns, key)
+
+    def forget_possible_misses(self, **kwargs: t.Any) -> None:
+        """Forget all remembered misses a row with the given column values could be a result for."""
+        if "guild_id" in kwargs:
+            partitions = [self.partitions.get(kwargs["guild_id"]), self.partitions.get(None)]
+        else:
+            partitions = list(self.partitions.values())
+
+        values = {column: value for column, value in kwargs.items() if column != "guild_id"}
+        for partition in partitions:
+            if partition is not None:
+                partition.forget_possible_misses(values)
+
+    def clear(self) -> None:
+        """Remove all rows and remembered misses from the table."""
+        self.partitions.clear()
+        self.order.clear()
+        self.count = 0
+
+    def size(self) -> int:
+        """Approximate the amount of memory used by the cached rows, in bytes."""
+        return sum(partition.size() for partition in self.partitions.values())
+
 
 class DatabaseCache:
     """
     A class aimed squarely at making caching of values easier to handle, and
     centralize it. It tries lazy-loading a dict whenever requesting data,
     or setting it.
+
+    Parameters
+    ----------
+    bot : SamuroBot
+        The bot this cache belongs to.
+    max_rows : Optional[int], optional
+        The maximum amount of rows to keep per table, by default None (unbounded)
+    ttl : Optional[float], optional
+        The amount of seconds after which cached rows are reloaded, by default None (never)
+    table_limits : Optional[Mapping[str, int]], optional
+        Per-table overrides for `max_rows`, by default None
+    negative_ttl : float, optional
+        The amount of seconds lookups with no rows are remembered for, by default NEGATIVE_TTL
+
+    Tables in PINNED_TABLES are exempt from both eviction and expiry.
+
+    Concurrent lookups that miss the same (table, filter) share a single in-flight query.
+
+    Changes to the tables listed in migration 6 are announced by the database on
+    INVALIDATION_CHANNEL, and every process sharing the database drops the affected rows,
+    regardless of which process made the change. Other tables are only invalidated by
+    the process calling `refresh`.
     """
 
-    def __init__(self, bot: SamuroBot) -> None:
+    def __init__(
+        self,
+        bot: SamuroBot,
+        *,
+        max_rows: t.Optional[int] = None,
+        ttl: t.Optional[float] = None,
+        table_limits: t.Optional[t.Mapping[str, int]] = None,
+        negative_ttl: float = NEGATIVE_TTL,
+    ) -> None:
         self.bot: SamuroBot = bot
-        self._cache: t.Dict[str, t.List[t.Dict[str, t.Any]]] = {}
+        self._cache: t.Dict[str, CachedTable] = {}
+        self._max_rows: t.Optional[int] = max_rows
+        self._ttl: t.Optional[float] = ttl
+        self._table_limits: t.Mapping[str, int] = table_limits or {}
+        self._negative_ttl: float = negative_ttl
+        self._inflight: t.Dict[FlightKeyT, asyncio.Task[None]] = {}
+        self._is_listening: bool = False
         self.is_ready: bool = False
 
     def _clean_kwarg(self, kwarg: str) -> str:
         return re.sub(r"\W|^(?=\d)", "_", kwarg)
 
+    def _create_table(self, table: str) -> CachedTable:
+        if table in PINNED_TABLES:
+            return CachedTable()
+        return CachedTable(max_rows=self._table_limits.get(table, self._max_rows), ttl=self._ttl)
+
     async def start(self) -> None:
         """
         Initialize the database cache. This should be called after the database is set up.
         """
+        # Imported here, models imports this module while it is being initialized
+        from models.db import DatabaseModel
+
         self.is_ready = False
         self._cache = {}
+        self._inflight = {}
         DatabaseModel._db_cache = self
 
         records = await self.bot.db.fetch(
@@ -44,7 +391,12 @@ class DatabaseCache:
         """
         )
         for record in records:
-            self._cache[record.get("tablename")] = []
+            self._cache[record.get("tablename")] = self._create_table(record.get("tablename"))
+
+        if not self._is_listening:
+            await self.bot.db.listen(INVALIDATION_CHANNEL, self._on_invalidation)
+            self._is_listening = True
+
         logger.info("Cache initialized!")
         self.is_ready = True
 
@@ -55,6 +407,7 @@ class DatabaseCache:
         """
         self.is_ready = False
         self._cache = {}
+        self._inflight = {}
 
     async def get(
         self, table: str, *, cache_only: bool = False, limit: t.Optional[int] = None, **kwargs: t.Any
@@ -80,31 +433,82 @@ class DatabaseCache:
         if not self.is_ready:
             return
 
-        rows: t.List[t.Dict[str, t.Any]] = []
-
-        for row in self._cache[table]:
-            if limit and len(rows) >= limit:
-                break
+        cached_table = self._cache[table]
+        rows = cached_table.find(limit, **kwargs)
+        cached_table.lookups += 1
 
-            # Check if all kwargs match what is in the row
-            if all([row[kwarg] == value for kwarg, value in kwargs.items()]):
-                rows.append(row)
+        if rows or cached_table.is_missing(**kwargs):
+            cached_table.hits += 1
 
-        if not rows and not cache_only:
-            await self.refresh(table, **kwargs)
+        elif not cache_only:
+            await self._load(table, **kwargs)
 
-            for row in self._cache[table]:
-                if limit and len(rows) >= limit:
-                    break
+            if cached_table := self._cache.get(table):
+                rows = cached_table.find(limit, **kwargs)
 
-                if all([row[kwarg] == value for kwarg, value in kwargs.items()]):
-                    rows.append(row)
         if rows:
             return rows
 
+    def _flight_key(self, table: str, kwargs: t.Dict[str, t.Any]) -> FlightKeyT:
+        columns = tuple(sorted(kwargs))
+        return table, columns, tuple(kwargs[column] for column in columns)
+
+    def _start_fetch(self, table: str, kwargs: t.Dict[str, t.Any]) -> asyncio.Task[None]:
+        """Start reloading a part of the cache, superseding any fetch already in flight for it."""
+        key = self._flight_key(table, kwargs)
+        task = asyncio.create_task(self._fetch(table, key, kwargs))
+        self._inflight[key] = task
+
+        def done(task: asyncio.Task[None]) -> None:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+            # Retrieve the exception so it is not logged when every waiter was cancelled
+            if not task.cancelled():
+                task.exception()
+
+        task.add_done_callback(done)
+        return task
+
+    async def _fetch(self, table: str, key: FlightKeyT, kwargs: t.Dict[str, t.Any]) -> None:
+        # Construct sql args, remove invalid python chars
+        sql_args = [f"{self._clean_kwarg(kwarg)} = ${i + 1}" for i, kwarg in enumerate(kwargs)]
+        records = await self.bot.db.fetch(f"""SELECT * FROM {table} WHERE {" AND ".join(sql_args)}""", *kwargs.values())
+
+        # A newer refresh was started while waiting on the database, or the cache was stopped
+        if self._inflight.get(key) is not asyncio.current_task():
+            return
+
+        cached_table = self._cache.get(table)
+        if cached_table is None:
+            return
+
+        # Pop old values that match the kwargs, reloading a whole guild just replaces it's partition
+        if kwargs.keys() == {"guild_id"}:
+            cached_table.drop_partition(kwargs["guild_id"])
+        else:
+            cached_table.remove_matching(**kwargs)
+
+        for record in records:
+            cached_table.add(dict(record))
+
+        if not records:
+            cached_table.mark_missing(self._negative_ttl, **kwargs)
+
+    async def _load(self, table: str, **kwargs: t.Any) -> None:
+        """Load a part of the cache, joining a fetch that is already in flight for it if there is one."""
+        key = self._flight_key(table, kwargs)
+        task = self._inflight.get(key) or self._start_fetch(table, kwargs)
+        await asyncio.shield(task)
+
+        # The fetch we waited on may have been superseded by a refresh after a write
+        while (newer := self._inflight.get(key)) is not None and newer is not task:
+            task = newer
+            await asyncio.shield(task)
+
     async def refresh(self, table: str, **kwargs) -> None:
         """
         Discards and reloads a specific part of the cache, should be called after modifying database values.
+        If no rows are found, the lookup is remembered as a miss until it expires or is refreshed again.
         """
         if not self.is_ready:
             return
@@ -112,17 +516,8 @@ class DatabaseCache:
         if self._cache.get(table) is None:
             raise ValueError("Invalid table specified.")
 
-        # Construct sql args, remove invalid python chars
-        sql_args = [f"{self._clean_kwarg(kwarg)} = ${i + 1}" for i, kwarg in enumerate(kwargs)]
-        records = await self.bot.db.fetch(f"""SELECT * FROM {table} WHERE {" AND ".join(sql_args)}""", *kwargs.values())
-
-        for i, row in enumerate(self._cache[table]):
-            # Pop old values that match the kwargs
-            if all([row[kwarg] == value for kwarg, value in kwargs.items()]):
-                self._cache[table].pop(i)
-
-        for record in records:
-            self._cache[table].append(dict(record))
+        # Always query again, a fetch already in flight may have started before the modification
+        await asyncio.shield(self._start_fetch(table, kwargs))
 
     async def wipe(self, guild: hikari.SnowflakeishOr[hikari.PartialGuild]) -> None:
         """
@@ -133,10 +528,82 @@ class DatabaseCache:
 
         guild_id = hikari.Snowflake(guild)
 
-        for table in self._cache.keys():
-            for i, row in enumerate(self._cache[table]):
-                if row.get("guild_id") == guild_id:
-                    self._cache[table].pop(i)
+        for cached_table in self._cache.values():
+            cached_table.drop_partition(guild_id)
+
+    def invalidate(self, table: str, **kwargs: t.Any) -> None:
+        """Drop rows from the cache without reloading them, they are fetched again on next lookup.
+
+        Parameters
+        ----------
+        table : str
+            The table to drop rows from.
+        **kwargs: t.Any, optional
+            Keyword-only arguments that denote columns to filter the dropped rows,
+            if none are given the entire table is dropped.
+        """
+        cached_table = self._cache.get(table)
+        if cached_table is None:
+            return
+
+        if kwargs.keys() == {"guild_id"}:
+            cached_table.drop_partition(kwargs["guild_id"])
+        elif kwargs:
+            cached_table.remove_matching(**kwargs)
+        else:
+            cached_table.clear()
+
+        # Only misses a changed row could be a result for may have become hits
+        cached_table.forget_possible_misses(**kwargs)
+
+        # Fetches in flight that may read a changed row could have read it before the change, start them over
+        for key in [key for key in self._inflight if key[0] == table]:
+            _, columns, values = key
+            lookup = dict(zip(columns, values))
+            if all(lookup[column] == value for column, value in kwargs.items() if column in lookup):
+                self._start_fetch(table, lookup)
+
+    def _on_invalidation(self, payload: t.Optional[str]) -> None:
+        if not self.is_ready:
+            return
+
+        if payload is None:
+            logger.warning("Database notifications may have been missed, dropping entire cache.")
+            for table in self._cache:
+                self.invalidate(table)
+            return
+
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            logger.warning(f"Received malformed cache invalidation payload: {payload}")
+            return
+
+        # Drop only the rows of the changed key, tables with neither column are dropped entirely
+        keys = {column: data[column] for column in ("guild_id", "user_id") if data.get(column) is not None}
+        self.invalidate(data["table"], **keys)
+
+    def stats(self) -> t.List[TableStats]:
+        """Get a snapshot of the cache usage of every cached table.
+
+        Returns
+        -------
+        List[TableStats]
+            The usage statistics of every table, ordered by their approximate size.
+        """
+        stats = [
+            TableStats(
+                table=table,
+                entries=len(cached_table),
+                bytes=cached_table.size(),
+                hits=cached_table.hits,
+                misses=cached_table.lookups - cached_table.hits,
+                evictions=cached_table.evictions,
+                pinned=table in PINNED_TABLES,
+            )
+            for table, cached_table in self._cache.items()
+        ]
+        return sorted(stats, key=lambda s: s.bytes, reverse=True)
 
 
 # by fenrir#5455
@@ -3,7 +3,7 @@ from __future__ import annotations
 import datetime
 import re
 import unicodedata
-from typing import List, Optional, Sequence
+from typing import TYPE_CHECKING, List, Optional, Sequence
 
 import hikari
 import lightbulb
@@ -11,9 +11,12 @@ import lightbulb
 from etc import constants as const
 from models import errors
 from models.components import *
-from models.context import SamuroContext, SamuroSlashContext
 from models.db_user import DatabaseUser
 
+if TYPE_CHECKING:
+    # models.context imports models.mod_actions, which imports this module
+    from models.context import SamuroContext, SamuroSlashContext
+
 MESSAGE_LINK_REGEX = re.compile(
     r"https?:\/\/(www\.)?[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b([-a-zA-Z0-9()!@:%_\+.~#?&\/\/=]*)channels[\/][0-9]{1,}[\/][0-9]{1,}[\/][0-9]{1,}"
 )
@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import typing as t
+from datetime import datetime
+
+import hikari
+
+from models import errors
+from models import statements
+from models.heroes import EventTypes
+from models.heroes import HotsEvent
+from models.heroes import HotsPlayer
+from models.heroes import get_season
+from utils import hots as util
+from utils.tasks import IntervalLoop
+
+logger = logging.getLogger(__name__)
+
+if t.TYPE_CHECKING:
+    from models import SamuroBot
+
+QueueKeyT = t.Tuple[int, int]
+
+LOBBY_SIZE = 10
+
+
+class MatchQueue:
+    """
+    The players waiting for a ranked 5x5 match in a room, in the order they joined.
+
+    Players are kept in an insertion-ordered dict, so joining, leaving and checking
+    membership are O(1), and the queue order is the iteration order.
+    """
+
+    def __init__(self, guild_id: int, room_id: int, *, win_points: int, lose_points: int, delta_mmr: int) -> None:
+        self.guild_id = guild_id
+        self.room_id = room_id
+        self.win_points = win_points
+        self.lose_points = lose_points
+        self.delta_mmr = delta_mmr
+        self.message_id: t.Optional[int] = None
+        """The message with the join and leave buttons of the queue."""
+        self.players: t.Dict[int, HotsPlayer] = {}
+        self.dirty: bool = False
+        """If the queue changed since it's last snapshot."""
+        self.lock = asyncio.Lock()
+        """Held while a lobby is popped, so that a room never gets two events at once."""
+
+    def __len__(self) -> int:
+        return len(self.players)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.players
+
+    def __iter__(self) -> t.Iterator[HotsPlayer]:
+        return iter(self.players.values())
+
+    def join(self, player: HotsPlayer) -> None:
+        """Add a player to the end of the queue."""
+        self.players[int(player.id)] = player
+        self.dirty = True
+
+    def leave(self, user_id: int) -> t.Optional[HotsPlayer]:
+        """Remove a player from the queue, returning it if it was queued."""
+        player = self.players.pop(user_id, None)
+        if player is not None:
+            self.dirty = True
+        return player
+
+    def restore(self, order: t.Sequence[int], players: t.Iterable[HotsPlayer]) -> None:
+        """Put players back into the queue at their former positions.
+
+        Parameters
+        ----------
+        order : Sequence[int]
+            The ids of the queue before the players left it.
+        players : Iterable[HotsPlayer]
+            The players to put back.
+        """
+        returning = {int(player.id): player for player in players}
+        waiting = self.players
+        self.players = {}
+        for user_id in order:
+            if user_id in returning:
+                self.players[user_id] = returning.pop(user_id)
+            elif user_id in waiting:
+                self.players[user_id] = waiting.pop(user_id)
+        # Players that joined in the meantime stay behind the returning ones
+        self.players.update(returning)
+        self.players.update(waiting)
+        self.dirty = True
+
+    def find_lobby(self, max_diff: t.Optional[int]) -> t.Optional[t.Tuple[t.List[HotsPlayer], t.List[HotsPlayer]]]:
+        """Find the first balanced enough lobby of the queue.
+
+        Parameters
+        ----------
+        max_diff : Optional[int]
+            The largest allowed difference between the mmr sums of the teams, None for any.
+
+        Returns
+        -------
+        Optional[Tuple[List[HotsPlayer], List[HotsPlayer]]]
+            The teams of the lobby, or None if the queue has no such lobby yet.
+        """
+        players = list(self.players.values())
+        teams = util.pick_lobby([player.mmr for player in players], lobby_size=LOBBY_SIZE, max_diff=max_diff)
+        if teams is None:
+            return None
+        return [players[index] for index in teams[0]], [players[index] for index in teams[1]]
+
+
+class QueueManager:
+    """
+    The matchmaking queues of every room, kept in memory and snapshotted to the database
+    periodically and on shutdown, then restored from the snapshot when the bot starts.
+
+    A player can wait in one queue per guild at a time.
+    """
+
+    def __init__(self, bot: SamuroBot, *, snapshot_interval: float = 30) -> None:
+        self.bot: SamuroBot = bot
+        self._queues: t.Dict[QueueKeyT, MatchQueue] = {}
+        self._rooms: t.Dict[QueueKeyT, int] = {}
+        """The room every queued player is waiting in, by guild and player."""
+        self._snapshot_loop = IntervalLoop(self.snapshot, seconds=snapshot_interval)
+        self._loaded = asyncio.Event()
+
+    def get(
+        self, guild: hikari.SnowflakeishOr[hikari.PartialGuild], room: hikari.SnowflakeishOr[hikari.TextableChannel]
+    ) -> t.Optional[MatchQueue]:
+        """Get the queue of a room, if it is open."""
+        return self._queues.get((hikari.Snowflake(guild), hikari.Snowflake(room)))
+
+    async def open(
+        self,
+        guild: hikari.SnowflakeishOr[hikari.PartialGuild],
+        room: hikari.SnowflakeishOr[hikari.TextableChannel],
+        *,
+        win_points: int,
+        lose_points: int,
+        delta_mmr: int,
+    ) -> MatchQueue:
+        """Open the queue of a room, or change the match settings of an already open one.
+
+        Parameters
+        ----------
+        guild : hikari.SnowflakeishOr[hikari.PartialGuild]
+            The guild of the room.
+        room : hikari.SnowflakeishOr[hikari.TextableChannel]
+            The room events of the queue are created in.
+        win_points : int
+            The points for a win in matches of the queue.
+        lose_points : int
+            The points for a loss in matches of the queue.
+        delta_mmr : int
+            The mmr change of matches of the queue.
+
+        Returns
+        -------
+        MatchQueue
+            The queue of the room.
+        """
+        key = (hikari.Snowflake(guild), hikari.Snowflake(room))
+        await self.bot.db.execute(statements.QUEUE_UPSERT, *key, win_points, lose_points, delta_mmr)
+
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = MatchQueue(
+                *key, win_points=win_points, lose_points=lose_points, delta_mmr=delta_mmr
+            )
+        else:
+            queue.win_points, queue.lose_points, queue.delta_mmr = win_points, lose_points, delta_mmr
+        return queue
+
+    async def set_message(self, queue: MatchQueue, message: hikari.SnowflakeishOr[hikari.PartialMessage]) -> None:
+        """Store the message with the buttons of a queue, so that they can be restarted with the bot."""
+        queue.message_id = hikari.Snowflake(message)
+        await self.bot.db.execute(statements.QUEUE_SET_MESSAGE, queue.guild_id, queue.room_id, queue.message_id)
+
+    def messages(self) -> t.List[t.Tuple[int, int]]:
+        """Get the room and the message with the buttons of every open queue that has one.
+
+        Returns
+        -------
+        List[Tuple[int, int]]
+            The room and message ids of the queues.
+        """
+        return [(queue.room_id, queue.message_id) for queue in self._queues.values() if queue.message_id is not None]
+
+    async def wait_until_loaded(self) -> None:
+        """Wait until the queues are restored by `load`."""
+        await self._loaded.wait()
+
+    async def close(
+        self, guild: hikari.SnowflakeishOr[hikari.PartialGuild], room: hikari.SnowflakeishOr[hikari.TextableChannel]
+    ) -> t.Optional[MatchQueue]:
+        """Close the queue of a room and release it's players, returning it if it was open."""
+        key = (hikari.Snowflake(guild), hikari.Snowflake(room))
+        queue = self._queues.pop(key, None)
+        if queue is None:
+            return None
+
+        for user_id in queue.players:
+            self._rooms.pop((queue.guild_id, user_id), None)
+        await self.bot.db.execute(statements.QUEUE_DELETE, *key)
+        return queue
+
+    def join(self, queue: MatchQueue, player: HotsPlayer) -> None:
+        """Add a player to a queue.
+
+        Raises
+        ------
+        errors.UserBlacklistedError
+            The player is blocked.
+        errors.AlreadyQueued
+            The player already waits in a queue of the guild.
+        """
+        if player.blocked:
+            raise errors.UserBlacklistedError(f"{player.battle_tag} заблокирован и не может принимать участие")
+        if (queue.guild_id, int(player.id)) in self._rooms:
+            raise errors.AlreadyQueued
+
+        queue.join(player)
+        self._rooms[(queue.guild_id, int(player.id))] = queue.room_id
+
+    def leave(self, queue: MatchQueue, user_id: int) -> t.Optional[HotsPlayer]:
+        """Remove a player from a queue, returning it if it was queued."""
+        player = queue.leave(user_id)
+        if player is not None:
+            self._rooms.pop((queue.guild_id, user_id), None)
+        return player
+
+    async def pop(
+        self, queue: MatchQueue, admin: hikari.User, max_diff: t.Optional[int] = None
+    ) -> t.Optional[HotsEvent]:
+        """Create an event from the first balanced enough lobby of a queue, if it has one
+        and the room of the queue has no active event. The players of the event leave the queue,
+        and are put back if the event could not be created. Blocked players are dropped from the queue.
+
+        Parameters
+        ----------
+        queue : MatchQueue
+            The queue to pop a lobby from.
+        admin : hikari.User
+            The user the event is created by.
+        max_diff : Optional[int]
+            The largest allowed difference between the mmr sums of the teams, None for any.
+
+        Returns
+        -------
+        Optional[HotsEvent]
+            The created event, or None if no lobby popped.
+        """
+        async with queue.lock:
+            for player in [player for player in queue if player.blocked]:
+                self.leave(queue, int(player.id))
+
+            if len(queue) < LOBBY_SIZE:
+                return None
+            if await self.bot.db.fetchval(statements.ROOMS_ACTIVE_EVENT, queue.guild_id, [queue.room_id]):
+                return None
+
+            teams = queue.find_lobby(max_diff)
+            if teams is None:
+                return None
+
+            # The lobby leaves the queue before the event is written, so that it's players
+            # can not leave the queue or join another one while they are being put into the match
+            blue, red = teams
+            order = list(queue.players)
+            for player in blue + red:
+                self.leave(queue, int(player.id))
+
+            try:
+                return await HotsEvent.create(
+                    datetime.now(),
+                    guild_id=queue.guild_id,
+                    admin=admin,
+                    room_id=queue.room_id,
+                    type=EventTypes.event5x5,
+                    win_p=queue.win_points,
+                    lose_p=queue.lose_points,
+                    delta_mmr=queue.delta_mmr,
+                    map=random.choice(util.maps),
+                    blue=blue,
+                    red=red,
+                    season=await get_season(queue.guild_id),
+                )
+            except Exception:
+                # Players that joined another queue of the guild in the meantime stay there
+                returning = [player for player in blue + red if (queue.guild_id, int(player.id)) not in self._rooms]
+                queue.restore(order, returning)
+                for player in returning:
+                    self._rooms[(queue.guild_id, int(player.id))] = queue.room_id
+                raise
+
+    async def load(self) -> None:
+        """Restore the queues from their last snapshot, with one query per guild for the players."""
+        for record in await self.bot.db.fetch(statements.QUEUES):
+            key = (record.get("guild_id"), record.get("room_id"))
+            self._queues[key] = MatchQueue(
+                *key,
+                win_points=record.get("win_points"),
+                lose_points=record.get("lose_points"),
+                delta_mmr=record.get("delta_mmr"),
+            )
+            self._queues[key].message_id = record.get("message_id")
+
+        queued: t.Dict[int, t.List[t.Tuple[int, int]]] = {}
+        for record in await self.bot.db.fetch(statements.QUEUES_PLAYERS):
+            queued.setdefault(record.get("guild_id"), []).append((record.get("room_id"), record.get("id")))
+
+        for guild_id, entries in queued.items():
+            fetched = await HotsPlayer.fetch_many([user_id for _, user_id in entries], guild_id, missing_ok=True)
+            players = {int(player.id): player for player in fetched}
+
+            for room_id, user_id in entries:
+                player = players.get(user_id)
+                if player is None:
+                    logger.warning(f"Dropping queued player {user_id} of guild {guild_id}, their profile was removed.")
+                    continue
+
+                queue = self._queues.get((guild_id, room_id))
+                if queue is not None and not player.blocked and (guild_id, user_id) not in self._rooms:
+                    self.join(queue, player)
+
+        for queue in self._queues.values():
+            queue.dirty = False
+        self._loaded.set()
+        logger.info(f"Restored {len(self._queues)} matchmaking queues with {len(self._rooms)} players.")
+
+    async def snapshot(self) -> None:
+        """Write the players of every queue that changed since the last snapshot to the database."""
+        queues = [queue for queue in self._queues.values() if queue.dirty]
+        if not queues:
+            return
+
+        try:
+            async with self.bot.db.transaction() as con:
+                for queue in queues:
+                    # Changes made while the snapshot is written mark the queue again
+                    queue.dirty = False
+                    rows = [(queue.guild_id, queue.room_id, pos, user_id) for pos, user_id in enumerate(queue.players)]
+                    await self.bot.db.execute(statements.QUEUE_PLAYERS_CLEAR, queue.guild_id, queue.room_id, con=con)
+                    await self.bot.db.executemany(statements.QUEUE_PLAYER_INSERT, rows, con=con)
+        except Exception:
+            for queue in queues:
+                queue.dirty = True
+            raise
+
+    def start(self) -> None:
+        """Start taking snapshots periodically."""
+        self._snapshot_loop.start()
+
+    async def stop(self) -> None:
+        """Stop taking snapshots periodically and take a final one."""
+        self._snapshot_loop.cancel()
+        await self.snapshot()
+
+
+# by fenrir#5455
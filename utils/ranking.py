@@ -0,0 +1,317 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import json
+import logging
+import typing as t
+
+import attr
+import hikari
+
+from models import statements
+from models.db import DatabaseModel
+
+logger = logging.getLogger(__name__)
+
+if t.TYPE_CHECKING:
+    from models import SamuroBot
+
+SeasonKeyT = t.Tuple[int, str]
+
+RANKINGS_CHANNEL: str = "player_rankings"
+"""The notification channel the database announces changes to players and their stats on, see migration 13."""
+
+
+@attr.frozen()
+class RankedPlayer:
+    """The ranking data of a single player in a season."""
+
+    id: int
+    btag: str
+    league: str
+    mmr: int
+    points: int
+    win: int
+    lose: int
+
+    @classmethod
+    def from_record(cls, record: t.Mapping[str, t.Any]) -> RankedPlayer:
+        """Create a ranked player from a row of the player_rankings table."""
+        return cls(
+            id=record.get("id"),
+            btag=record.get("btag"),
+            league=record.get("league"),
+            mmr=record.get("mmr") or 0,
+            points=record.get("points") or 0,
+            win=record.get("win") or 0,
+            lose=record.get("lose") or 0,
+        )
+
+
+class RankIndex:
+    """
+    Player ids ordered by descending score, ties broken by ascending id.
+
+    Entries are kept in a sorted list, so ranks and neighbours are found by bisection in
+    O(log n). Updates shift the list in O(n), which for the few thousand players of a
+    guild is a single memmove.
+    """
+
+    __slots__ = ("_keys", "_scores")
+
+    def __init__(self) -> None:
+        self._keys: t.List[t.Tuple[int, int]] = []
+        self._scores: t.Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, player_id: int) -> bool:
+        return player_id in self._scores
+
+    def set(self, player_id: int, score: int) -> None:
+        """Insert a player, or move it to it's new score."""
+        old = self._scores.get(player_id)
+        if old == score:
+            return
+        if old is not None:
+            del self._keys[bisect.bisect_left(self._keys, (-old, player_id))]
+
+        self._scores[player_id] = score
+        bisect.insort(self._keys, (-score, player_id))
+
+    def remove(self, player_id: int) -> None:
+        """Remove a player if it is present."""
+        old = self._scores.pop(player_id, None)
+        if old is not None:
+            del self._keys[bisect.bisect_left(self._keys, (-old, player_id))]
+
+    def rank(self, player_id: int) -> t.Optional[int]:
+        """Get the 1-based rank of a player, or None if it is not ranked."""
+        score = self._scores.get(player_id)
+        if score is None:
+            return None
+        return bisect.bisect_left(self._keys, (-score, player_id)) + 1
+
+    def top(self, amount: int) -> t.List[int]:
+        """Get the ids of the best ranked players."""
+        return [player_id for _, player_id in self._keys[:amount]]
+
+    def around(self, player_id: int, radius: int) -> t.List[int]:
+        """Get the ids of up to `radius` players ranked above and below a player, including itself."""
+        rank = self.rank(player_id)
+        if rank is None:
+            return []
+        return [key[1] for key in self._keys[max(0, rank - 1 - radius) : rank + radius]]
+
+
+class SeasonRanking:
+    """The rankings of the players of a single guild and season, overall and per league."""
+
+    def __init__(self) -> None:
+        self.players: t.Dict[int, RankedPlayer] = {}
+        self.points = RankIndex()
+        self.league_points: t.Dict[str, RankIndex] = {}
+        self.league_mmr: t.Dict[str, RankIndex] = {}
+
+    def __len__(self) -> int:
+        return len(self.players)
+
+    def __contains__(self, player_id: int) -> bool:
+        return player_id in self.players
+
+    def set(self, player: RankedPlayer) -> None:
+        """Insert a player, or update it's position in every ranking."""
+        old = self.players.get(player.id)
+        if old is not None and old.league != player.league:
+            self.league_points[old.league].remove(player.id)
+            self.league_mmr[old.league].remove(player.id)
+
+        self.players[player.id] = player
+        self.points.set(player.id, player.points)
+        self.league_points.setdefault(player.league, RankIndex()).set(player.id, player.points)
+        self.league_mmr.setdefault(player.league, RankIndex()).set(player.id, player.mmr)
+
+    def remove(self, player_id: int) -> None:
+        """Remove a player from every ranking if it is present."""
+        player = self.players.pop(player_id, None)
+        if player is None:
+            return
+
+        self.points.remove(player_id)
+        self.league_points[player.league].remove(player_id)
+        self.league_mmr[player.league].remove(player_id)
+
+    def points_rank(self, player_id: int) -> t.Optional[int]:
+        """Get the rank of a player by points among all players of the season."""
+        return self.points.rank(player_id)
+
+    def league_mmr_rank(self, player_id: int) -> t.Optional[int]:
+        """Get the rank of a player by mmr among the players of it's league."""
+        player = self.players.get(player_id)
+        if player is None:
+            return None
+        return self.league_mmr[player.league].rank(player_id)
+
+    def leaderboard(self, amount: int, league: t.Optional[str] = None) -> t.List[RankedPlayer]:
+        """Get the players with the most points, optionally only within a league."""
+        index = self.points if league is None else self.league_points.get(league)
+        if index is None:
+            return []
+        return [self.players[player_id] for player_id in index.top(amount)]
+
+    def around(self, player_id: int, radius: int, league: t.Optional[str] = None) -> t.List[RankedPlayer]:
+        """Get the players ranked next to a player by points, optionally only within a league."""
+        index = self.points if league is None else self.league_points.get(league)
+        if index is None:
+            return []
+        return [self.players[other_id] for other_id in index.around(player_id, radius)]
+
+
+class RankingIndex:
+    """
+    In-memory rankings of every guild and season, loaded lazily from the player_rankings table
+    the first time they are requested, then kept up to date as matches end and players change.
+
+    Only rankings that are already loaded are updated, the others are read from the database
+    when they are first needed, which already includes the changes. Changes made by other processes
+    or directly in the database are announced by notifications, the players they name are then
+    refreshed from the database.
+    """
+
+    def __init__(self, bot: SamuroBot) -> None:
+        self.bot: SamuroBot = bot
+        self._seasons: t.Dict[SeasonKeyT, SeasonRanking] = {}
+        self._loading: t.Dict[SeasonKeyT, asyncio.Task[SeasonRanking]] = {}
+        self._stale: t.Dict[SeasonKeyT, t.Set[int]] = {}
+        self._refresh_task: t.Optional[asyncio.Task[None]] = None
+        self._is_listening: bool = False
+        DatabaseModel._rankings = self
+
+    async def start(self) -> None:
+        """Start listening for changes to the players of the loaded rankings."""
+        if not self._is_listening:
+            await self.bot.db.listen(RANKINGS_CHANNEL, self._on_notification)
+            self._is_listening = True
+
+    async def get(self, guild: hikari.SnowflakeishOr[hikari.PartialGuild], season: str) -> SeasonRanking:
+        """Get the rankings of a guild in a season, loading them from the database if needed.
+
+        Parameters
+        ----------
+        guild : hikari.SnowflakeishOr[hikari.PartialGuild]
+            The guild to get the rankings of.
+        season : str
+            The season to get the rankings of.
+
+        Returns
+        -------
+        SeasonRanking
+            The rankings of the guild in the season.
+        """
+        key = (hikari.Snowflake(guild), season)
+        ranking = self._seasons.get(key)
+        if ranking is not None:
+            return ranking
+
+        task = self._loading.get(key)
+        if task is None:
+            task = self._loading[key] = asyncio.create_task(self._load(key))
+            task.add_done_callback(lambda _: self._loading.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, key: SeasonKeyT) -> SeasonRanking:
+        ranking = SeasonRanking()
+        for record in await self.bot.db.fetch(statements.SEASON_RANKINGS, *key):
+            ranking.set(RankedPlayer.from_record(record))
+
+        self._seasons[key] = ranking
+        return ranking
+
+    async def update(
+        self, guild: hikari.SnowflakeishOr[hikari.PartialGuild], season: str, players: t.Iterable[RankedPlayer]
+    ) -> None:
+        """Update players in the rankings of a guild in a season, if they are loaded.
+        This should be called after the changes are committed to the database.
+
+        Parameters
+        ----------
+        guild : hikari.SnowflakeishOr[hikari.PartialGuild]
+            The guild the players belong to.
+        season : str
+            The season the players played in.
+        players : Iterable[RankedPlayer]
+            The new ranking data of the players.
+        """
+        key = (hikari.Snowflake(guild), season)
+        task = self._loading.get(key)
+        if task is not None:
+            # It may have read the database before the changes were committed
+            await asyncio.shield(task)
+
+        ranking = self._seasons.get(key)
+        if ranking is None:
+            return
+
+        for player in players:
+            ranking.set(player)
+
+    async def update_records(self, records: t.Iterable[t.Mapping[str, t.Any]]) -> None:
+        """Update players in the loaded rankings from rows of the player_rankings table,
+        such as the ones returned by `refresh_player_rankings`.
+        This should be called after the changes are committed to the database.
+
+        Parameters
+        ----------
+        records : Iterable[Mapping[str, Any]]
+            The changed rows, of any guilds and seasons.
+        """
+        seasons: t.Dict[SeasonKeyT, t.List[RankedPlayer]] = {}
+        for record in records:
+            key = (record.get("guild_id"), record.get("season"))
+            seasons.setdefault(key, []).append(RankedPlayer.from_record(record))
+
+        for (guild_id, season), players in seasons.items():
+            await self.update(guild_id, season, players)
+
+    def _on_notification(self, payload: t.Optional[str]) -> None:
+        if payload is None:
+            logger.warning("Database notifications may have been missed, dropping loaded rankings.")
+            self._seasons.clear()
+            self._stale.clear()
+            return
+
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            logger.warning(f"Received malformed player rankings payload: {payload}")
+            return
+
+        # Players have no season, their mmr and league are part of the rankings of every season
+        for key in self._seasons.keys() | self._loading.keys():
+            if key[0] == data["guild_id"] and data["season"] in (None, key[1]):
+                self._stale.setdefault(key, set()).add(data["id"])
+
+        if self._stale and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self._refresh_stale())
+
+    async def _refresh_stale(self) -> None:
+        # Notifications received while refreshing are picked up by the next iteration
+        while self._stale:
+            key, ids = self._stale.popitem()
+            try:
+                records = await self.bot.db.fetch(statements.REFRESH_RANKINGS, *key, list(ids))
+            except Exception as e:
+                logger.error(f"Failed refreshing the rankings of {key}, dropping them: {e}")
+                self._seasons.pop(key, None)
+                continue
+
+            await self.update(key[0], key[1], [RankedPlayer.from_record(record) for record in records])
+            if (ranking := self._seasons.get(key)) is not None:
+                # Players without stats of the season left it's ranking
+                for player_id in ids - {record.get("id") for record in records}:
+                    ranking.remove(player_id)
+
+
+# by fenrir#5455
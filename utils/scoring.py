@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import functools
+import itertools
+import typing as t
+
+import attr
+import numpy as np
+
+
+@attr.frozen()
+class SplitWeights:
+    """The weights of the cost terms a split of a lobby into two teams is scored by."""
+
+    mmr: float = 1.0
+    """Per point of difference between the mmr sums of the teams."""
+
+    mmr_spread: float = 0.25
+    """Per point of difference between the mmr standard deviations of the teams."""
+
+    league: float = 10.0
+    """Per league of difference between the league sums of the teams."""
+
+    repeat_teammates: float = 2.0
+    """Per match that two players of the same team have already played together."""
+
+    winstreak: float = 3.0
+    """Per match of difference between the winstreak sums of the teams."""
+
+
+@attr.frozen()
+class LobbyStats:
+    """The per-player inputs of split scoring, all indexed by the position of the player in the lobby."""
+
+    mmr: t.Sequence[int]
+    """The mmr of each player."""
+
+    leagues: t.Sequence[int]
+    """The league of each player, as a number that grows with the league."""
+
+    winstreaks: t.Sequence[int]
+    """The current winstreak of each player, negative for a losing streak."""
+
+    teammates: t.Sequence[t.Sequence[int]]
+    """How many matches each pair of players has played in the same team, a symmetric matrix."""
+
+
+@attr.frozen()
+class ScoredSplit:
+    """A split of a lobby into two teams, with it's cost."""
+
+    cost: float
+    """The weighted cost of the split, lower is better."""
+
+    team_one: t.Tuple[int, ...]
+    """The positions of the players of the first team."""
+
+    team_two: t.Tuple[int, ...]
+    """The positions of the players of the second team."""
+
+
+@functools.lru_cache(maxsize=16)
+def _splits(players: int) -> t.Tuple[t.Tuple[int, ...], ...]:
+    """Every split of `players` into two equal teams, as the first team, which always has the first player,
+    so that no split is listed twice with the teams swapped."""
+    return tuple((0, *rest) for rest in itertools.combinations(range(1, players), players // 2 - 1))
+
+
+@functools.lru_cache(maxsize=16)
+def _split_matrix(players: int) -> np.ndarray:
+    """The membership matrix of `_splits`, one row per split with 1.0 for the players of the first team."""
+    splits = np.array(_splits(players), dtype=np.intp)
+    matrix = np.zeros((len(splits), players))
+    np.put_along_axis(matrix, splits, 1.0, axis=1)
+    matrix.flags.writeable = False
+    return matrix
+
+
+def _costs_numpy(stats: LobbyStats, weights: SplitWeights) -> t.Sequence[float]:
+    one = _split_matrix(len(stats.mmr))
+    two = 1.0 - one
+    size = one.shape[1] // 2
+
+    mmr = np.asarray(stats.mmr, dtype=np.float64)
+    mmr_one, mmr_two = one @ mmr, two @ mmr
+    squares_one, squares_two = one @ mmr**2, two @ mmr**2
+    spread_one = np.sqrt(np.maximum(squares_one / size - (mmr_one / size) ** 2, 0.0))
+    spread_two = np.sqrt(np.maximum(squares_two / size - (mmr_two / size) ** 2, 0.0))
+
+    leagues = np.asarray(stats.leagues, dtype=np.float64)
+    winstreaks = np.asarray(stats.winstreaks, dtype=np.float64)
+    teammates = np.asarray(stats.teammates, dtype=np.float64)
+    # Each pair of the same team is counted twice by the quadratic form, the diagonal is zero
+    repeats = (((one @ teammates) * one).sum(axis=1) + ((two @ teammates) * two).sum(axis=1)) / 2
+
+    return (
+        weights.mmr * np.abs(mmr_one - mmr_two)
+        + weights.mmr_spread * np.abs(spread_one - spread_two)
+        + weights.league * np.abs(one @ leagues - two @ leagues)
+        + weights.repeat_teammates * repeats
+        + weights.winstreak * np.abs(one @ winstreaks - two @ winstreaks)
+    )
+
+
+def score_splits(stats: LobbyStats, weights: SplitWeights = SplitWeights(), top: int = 5) -> t.List[ScoredSplit]:
+    """Score every split of a lobby into two equal teams and get the best ones.
+
+    All splits are scored at once, as products of the cached split membership matrix.
+
+    Parameters
+    ----------
+    stats : LobbyStats
+        The players of the lobby, an even amount.
+    weights : SplitWeights
+        The weights of the cost terms.
+    top : int
+        The amount of splits to return.
+
+    Returns
+    -------
+    List[ScoredSplit]
+        The `top` splits with the lowest cost, best first.
+
+    Raises
+    ------
+    ValueError
+        The lobby has an odd amount of players.
+    """
+    players = len(stats.mmr)
+    if not players or players % 2:
+        raise ValueError("A lobby must have an even amount of players.")
+
+    costs = _costs_numpy(stats, weights)
+    best = np.argsort(costs, kind="stable")[:top].tolist()
+
+    splits = _splits(players)
+    return [
+        ScoredSplit(
+            cost=float(costs[index]),
+            team_one=splits[index],
+            team_two=tuple(i for i in range(players) if i not in splits[index]),
+        )
+        for index in best
+    ]
+
+
+# by fenrir#5455